@@ -8,6 +8,15 @@ extras_require = {
         'braceexpand == 0.1.5',
         'import-expression==1.0.0',
         'jishaku == 1.17.1.181'
+    ],
+    's3': [
+        'boto3 == 1.12.0'
+    ],
+    'sqlite': [
+        'aiosqlite == 0.11.0'
+    ],
+    'test': [
+        'pytest >= 5.3.5'
     ]
 }
 
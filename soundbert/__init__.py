@@ -1,18 +1,29 @@
 import argparse
+import asyncio
 import logging
 import sys
 from pathlib import Path
 
 from alembic.config import Config as AlembicConfig, CommandLine
+from databases import Database
 
 from .config import Config
+from .logs import setup_logging
+from .normalize import Normalizer
 from .soundbert import SoundBert
+from .storage import Storage
 
 log = logging.getLogger(__name__)
 
 parser = argparse.ArgumentParser(description='A discord bot that play sounds.')
 subparsers = parser.add_subparsers(dest='action')
 run_parser = subparsers.add_parser('run', help='Run the bot.')
+normalize_parser = subparsers.add_parser(
+        'normalize',
+        help='Transcode sounds into a format that is cheap to decode. Can be stopped and resumed at any time.'
+)
+normalize_parser.add_argument('--limit', type=int, help='Stop after this many sounds.')
+normalize_parser.add_argument('--throttle', type=float, default=0.0, help='Seconds to wait after each sound.')
 migrate_parser = subparsers.add_parser('migrate', help='Run database migrations for the bot.')
 migrate_parser.add_argument(
         'alembic_args',
@@ -24,9 +35,9 @@ migrate_parser.add_argument(
 def main():
     args = parser.parse_args()
 
-    logging.basicConfig(level=logging.WARNING)
-
     config = Config.from_env()
+    setup_logging(config)
+
     log_level = getattr(logging, config.log_level)
     if not isinstance(log_level, int):
         log.critical('Invalid log level.')
@@ -35,6 +46,8 @@ def main():
 
     if args.action == 'run':
         run(config)
+    elif args.action == 'normalize':
+        asyncio.get_event_loop().run_until_complete(normalize(config, args.limit, args.throttle))
     else:
         migrate(args.alembic_args)
 
@@ -44,6 +57,18 @@ def run(config):
     bot.run()
 
 
+async def normalize(config, limit, throttle):
+    db = Database(config.database_url)
+    await db.connect()
+    try:
+        normalizer = Normalizer(db, Storage.from_config(config), throttle=throttle)
+        report = await normalizer.run(limit)
+    finally:
+        await db.disconnect()
+
+    print(report)
+
+
 def migrate(args):
     alembic_command_line = CommandLine()
     options = alembic_command_line.parser.parse_args(args)
@@ -68,7 +68,10 @@ def run_migrations_online():
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection,
+            target_metadata=target_metadata,
+            # sqlite can't alter most things in place, so autogenerated migrations need to recreate tables instead.
+            render_as_batch=connection.dialect.name == 'sqlite'
         )
 
         with context.begin_transaction():
@@ -32,11 +32,15 @@ def upgrade():
             sa.Column('stopped', sa.Integer(), server_default='0', nullable=False),
             sa.Column('source', sa.Text(), nullable=False),
             sa.Column('uploader', sa.BigInteger(), nullable=False),
-            sa.Column('upload_time', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+            sa.Column('upload_time', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
             sa.Column('length', sa.Float(), nullable=False),
             sa.PrimaryKeyConstraint('id')
     )
-    op.execute("CREATE COLLATION case_insensitive (provider = icu, locale = 'und-u-ks-level2', deterministic = false)")
+    # sqlite uses its built in NOCASE collation instead, see database.py.
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(
+                "CREATE COLLATION case_insensitive (provider = icu, locale = 'und-u-ks-level2', deterministic = false)"
+        )
     op.create_table(
             'sound_names',
             sa.Column('id', sa.Integer(), nullable=False),
@@ -55,7 +59,8 @@ def upgrade():
 def downgrade():
     # ### commands auto generated by Alembic - please adjust! ###
     op.drop_table('sound_names')
-    op.execute('DROP COLLATION case_insensitive')
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP COLLATION case_insensitive')
     op.drop_table('sounds')
     op.drop_table('guilds')
     # ### end Alembic commands ###
@@ -0,0 +1,76 @@
+"""lookup indexes
+
+Revision ID: 5b2e8c41d7f3
+Revises: 03c991204ea9
+Create Date: 2026-10-19 10:12:45.318204
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '5b2e8c41d7f3'
+down_revision = '03c991204ea9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    postgresql = op.get_bind().dialect.name == 'postgresql'
+
+    if postgresql:
+        # search uses the similarity operator from pg_trgm.
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    # names used to be unique per sound rather than per guild, so concurrent !adds may have left duplicates behind,
+    # which would fail the unique index. keep the oldest of each, and drop the sounds left without a name; only one
+    # file per name was ever kept, so they had no audio of their own anyway.
+    sound_names = sa.table(
+            'sound_names',
+            sa.column('id'),
+            sa.column('sound_id'),
+            sa.column('guild_id'),
+            sa.column('name')
+    )
+    sounds = sa.table('sounds', sa.column('id'))
+    op.execute(
+            sound_names.delete()
+                .where(sound_names.c.id.notin_(
+                    sa.select([sa.func.min(sound_names.c.id)])
+                        .group_by(sound_names.c.guild_id, sound_names.c.name)
+            ))
+    )
+    op.execute(
+            sounds.delete()
+                .where(sounds.c.id.notin_(sa.select([sound_names.c.sound_id])))
+    )
+
+    op.create_index(
+            'ix_sound_names_guild_id_name',
+            'sound_names',
+            ['guild_id', 'name'],
+            unique=True
+    )
+    op.create_index(
+            'ix_sound_names_guild_id_name_not_alias',
+            'sound_names',
+            ['guild_id', 'name'],
+            postgresql_where=sa.text('NOT is_alias'),
+            sqlite_where=sa.text('NOT is_alias')
+    )
+    if postgresql:
+        op.create_index(
+                'ix_sound_names_name_trgm',
+                'sound_names',
+                ['name'],
+                postgresql_using='gin',
+                postgresql_ops={'name': 'gin_trgm_ops'}
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_sound_names_name_trgm', table_name='sound_names')
+    op.drop_index('ix_sound_names_guild_id_name_not_alias', table_name='sound_names')
+    op.drop_index('ix_sound_names_guild_id_name', table_name='sound_names')
+    # pg_trgm is left installed, since search relied on it before this revision.
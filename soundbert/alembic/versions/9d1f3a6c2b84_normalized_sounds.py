@@ -0,0 +1,27 @@
+"""normalized sounds
+
+Revision ID: 9d1f3a6c2b84
+Revises: 5b2e8c41d7f3
+Create Date: 2026-10-19 13:40:02.511873
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '9d1f3a6c2b84'
+down_revision = '5b2e8c41d7f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+            'sounds',
+            sa.Column('normalized', sa.Boolean(), server_default=sa.text('false'), nullable=False)
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('sounds') as batch_op:
+        batch_op.drop_column('normalized')
@@ -1,15 +1,214 @@
+import io
+import os
+import sys
+import time
+from pathlib import Path
+
+import discord
 from discord.ext import commands
 
+from .utils.humantime import humanduration, TimeUnits
+from .utils.profiling import AllocationTracker, SamplingProfiler, task_stacks
 from ..soundbert import SoundBert
 
+# the longest a profile may run for, in seconds.
+MAX_PROFILE_DURATION = 120
+
 
 class Admin(commands.Cog, command_attrs=dict(hidden=True)):
     def __init__(self, bot: 'SoundBert'):
         self.bot = bot
+        self.allocations = AllocationTracker()
+        self.profiling = False
 
     async def cog_check(self, ctx: commands.Context):
         return await self.bot.is_owner(ctx.author)
 
+    @commands.command()
+    async def cache(self, ctx: commands.Context):
+        """
+        Show audio cache statistics.
+        """
+        stats = self.bot.get_cog('SoundBoard').audio_cache.stats()
+
+        await ctx.send(
+                f'Hit rate: {stats.hit_rate:.1%} ({stats.hits} hits, {stats.misses} misses)\n'
+                f'Entries: {stats.entries}, {stats.size / (1 << 20):.1f}/{stats.max_size / (1 << 20):.0f} MB\n'
+                f'Admitted: {stats.admissions}, rejected: {stats.rejections}, evicted: {stats.evictions}'
+        )
+
+    @commands.command()
+    async def audio(self, ctx: commands.Context):
+        """
+        Show shared audio scheduler statistics.
+        """
+        scheduler = self.bot.get_cog('SoundBoard').scheduler
+        if scheduler is None:
+            await ctx.send('The shared audio scheduler is disabled.')
+            return
+
+        stats = scheduler.stats()
+        await ctx.send(
+                f'Streams: {stats.streams}, threads: {stats.threads}\n'
+                f'Tick lateness: {stats.mean_lateness * 1000:.2f} ms mean, {stats.max_lateness * 1000:.2f} ms max '
+                f'over {stats.ticks} ticks'
+        )
+
+    @commands.command()
+    async def lag(self, ctx: commands.Context):
+        """
+        Show event loop lag and the most recent calls that blocked it.
+        """
+        watchdog = self.bot.watchdog
+        if watchdog is None:
+            await ctx.send('The event loop watchdog is disabled.')
+            return
+
+        stats = watchdog.stats()
+        lines = [
+            f'Lag over {stats.samples} samples: {stats.mean * 1000:.1f} ms mean, {stats.p99 * 1000:.1f} ms p99, '
+            f'{stats.max * 1000:.1f} ms max',
+            f'Blocked for over {watchdog.threshold * 1000:.0f} ms: {stats.stalls} times'
+        ]
+        for stall in reversed(stats.recent_stalls[-5:]):
+            ago = humanduration(max(1, int(time.time() - stall.when)), TimeUnits.SECONDS)
+            lines.append(f'`{stall.call_site}` for over {stall.blocked * 1000:.0f} ms, {ago} ago')
+        await ctx.send('\n'.join(lines))
+
+    @commands.command()
+    async def memory(self, ctx: commands.Context):
+        """
+        Show memory usage, overall and per 1000 guilds.
+        """
+        rss = _rss()
+        guilds = len(self.bot.guilds)
+        per_1k = f'{rss / guilds * 1000 / (1 << 20):.1f} MB' if guilds else 'n/a'
+
+        await ctx.send(
+                f'RSS: {rss / (1 << 20):.1f} MB\n'
+                f'Guilds: {guilds}\n'
+                f'RSS per 1k guilds: {per_1k}\n'
+                f'Cached users: {len(self.bot.users)}, messages: {len(self.bot.cached_messages)}'
+        )
+
+    @commands.command()
+    async def profile(self, ctx: commands.Context, seconds: float = 10.0, interval: float = 0.005):
+        """
+        Sample what every thread is doing for a while, and upload the stacks in the collapsed stack format for
+        flamegraph.pl or speedscope.
+
+        :param seconds: How long to sample for.
+        :param interval: Seconds between samples.
+        """
+        if not 0 < seconds <= MAX_PROFILE_DURATION:
+            raise commands.BadArgument(f'Can profile for at most {MAX_PROFILE_DURATION} seconds.')
+        if not 0.001 <= interval <= 1:
+            raise commands.BadArgument('The interval must be between 0.001 and 1 seconds.')
+        if self.profiling:
+            raise commands.BadArgument('Already profiling.')
+
+        profiler = SamplingProfiler(interval)
+        self.profiling = True
+        try:
+            async with ctx.typing():
+                await self.bot.loop.run_in_executor(None, profiler.run, seconds)
+        finally:
+            self.profiling = False
+
+        await ctx.send(
+                f'{profiler.samples} samples over {seconds:g}s.',
+                file=_text_file(profiler.collapsed(), f'profile-{int(time.time())}.folded')
+        )
+
+    @commands.group(invoke_without_command=True)
+    async def allocations(self, ctx: commands.Context):
+        """
+        Trace memory allocations with tracemalloc. Use snapshot to take a baseline and diff to see what grew since.
+        """
+        if self.allocations.tracing:
+            current, peak = self.allocations.traced()
+            await ctx.send(f'Tracing. {current / (1 << 20):.1f} MB traced now, {peak / (1 << 20):.1f} MB at peak.')
+        else:
+            await ctx.send('Not tracing.')
+
+    @allocations.command(name='start')
+    async def allocations_start(self, ctx: commands.Context, frames: int = 1):
+        """
+        Start tracing. Allocations are slower while tracing, the more so the more frames are kept.
+
+        :param frames: How many frames of each allocation's traceback to keep.
+        """
+        if not 1 <= frames <= 64:
+            raise commands.BadArgument('Can keep between 1 and 64 frames.')
+        self.allocations.start(frames)
+        await ctx.send(f'Tracing allocations with {frames} frames.')
+
+    @allocations.command(name='stop')
+    async def allocations_stop(self, ctx: commands.Context):
+        """
+        Stop tracing and drop the baseline.
+        """
+        self.allocations.stop()
+        await ctx.send('Stopped tracing allocations.')
+
+    @allocations.command(name='snapshot')
+    async def allocations_snapshot(self, ctx: commands.Context):
+        """
+        Take a snapshot to diff against later, and upload the biggest allocation sites.
+        """
+        if not self.allocations.tracing:
+            raise commands.BadArgument('Not tracing allocations.')
+
+        report = self.allocations.snapshot()
+        await ctx.send(file=_text_file(report, f'snapshot-{int(time.time())}.txt'))
+
+    @allocations.command(name='diff')
+    async def allocations_diff(self, ctx: commands.Context):
+        """
+        Upload the allocation sites that grew the most since the last snapshot.
+        """
+        if not self.allocations.tracing:
+            raise commands.BadArgument('Not tracing allocations.')
+
+        try:
+            report = self.allocations.diff()
+        except ValueError as e:
+            raise commands.BadArgument(str(e))
+        await ctx.send(file=_text_file(report, f'diff-{int(time.time())}.txt'))
+
+    @commands.command()
+    async def tasks(self, ctx: commands.Context):
+        """
+        Upload the stack of every asyncio task.
+        """
+        await ctx.send(file=_text_file(task_stacks(self.bot.loop), f'tasks-{int(time.time())}.txt'))
+
+    def cog_unload(self):
+        if self.allocations.tracing:
+            self.allocations.stop()
+
+
+def _text_file(text: str, filename: str) -> discord.File:
+    return discord.File(io.BytesIO(text.encode()), filename=filename)
+
+
+def _rss() -> int:
+    """
+    :return: The resident set size of this process in bytes.
+    """
+    try:
+        with Path('/proc/self/statm').open() as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        pass
+
+    # not available on windows.
+    import resource
+
+    # this is the peak rather than the current size, in kilobytes on linux and bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
 
 def setup(bot):
     bot.add_cog(Admin(bot))
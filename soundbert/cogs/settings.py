@@ -1,6 +1,5 @@
 import discord
 from discord.ext import commands
-from sqlalchemy import select
 
 from .utils.reactions import ok
 from ..database import guilds
@@ -10,7 +9,7 @@ from ..soundbert import SoundBert
 async def is_botmaster(ctx: commands.Context):
     if await ctx.bot.is_owner(ctx.author):
         return True
-    if ctx.guild.owner == ctx.author:
+    if ctx.guild.owner_id == ctx.author.id:
         return True
     if ctx.author.guild_permissions.manage_guild:
         return True
@@ -31,10 +30,7 @@ class Settings(commands.Cog):
         Use !settings <setting> <value> to change a setting's value.
         """
 
-        settings = await self.bot.db.fetch_one(
-            select([guilds.c.prefix, guilds.c.soundmaster, guilds.c.soundplayer])
-                .where(guilds.c.id == ctx.guild.id)
-        )
+        settings = await self.bot.guild_settings(ctx.guild.id)
 
         embed = discord.Embed()
         embed.title = 'Settings'
@@ -72,6 +68,7 @@ class Settings(commands.Cog):
                 .where(guilds.c.id == ctx.guild.id)
                 .values(prefix=prefix)
         )
+        await self.bot.notifier.publish('guild', guild_id=ctx.guild.id)
         await ok(ctx)
 
     @settings.command()
@@ -89,6 +86,7 @@ class Settings(commands.Cog):
                 .where(guilds.c.id == ctx.guild.id)
                 .values(soundmaster=role.id)
         )
+        await self.bot.notifier.publish('guild', guild_id=ctx.guild.id)
         await ok(ctx)
 
     @settings.command()
@@ -105,6 +103,7 @@ class Settings(commands.Cog):
                 .where(guilds.c.id == ctx.guild.id)
                 .values(soundplayer=role.id)
         )
+        await self.bot.notifier.publish('guild', guild_id=ctx.guild.id)
         await ok(ctx)
 
 
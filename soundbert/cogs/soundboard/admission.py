@@ -0,0 +1,131 @@
+import asyncio
+import time
+from typing import Dict, Hashable
+
+from . import exceptions
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        """
+        :param rate: Tokens added per second.
+        :param capacity: Maximum number of tokens, i.e. the largest allowed burst.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def retry_after(self) -> float:
+        """
+        :return: Seconds until a token is available, or 0 if one is available now.
+        """
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    @property
+    def full(self) -> bool:
+        return self.tokens >= self.capacity
+
+
+class Admission:
+    """
+    Token bucket rate limiting per guild and per user. A request is only admitted if both of its buckets have a
+    token to spare, so a single guild can't starve everyone else, and a single user can't starve their guild.
+    """
+
+    # prune idle buckets once there are this many of them.
+    MAX_BUCKETS = 10000
+
+    def __init__(self, guild_rate: float, guild_burst: int, user_rate: float, user_burst: int):
+        self.guild_rate = guild_rate
+        self.guild_burst = guild_burst
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+
+        self.guilds: Dict[int, TokenBucket] = {}
+        self.users: Dict[int, TokenBucket] = {}
+
+    def admit(self, guild_id: int, user_id: int) -> float:
+        """
+        Try to admit a request.
+
+        :param guild_id: The guild the request came from.
+        :param user_id: The user that made the request.
+        :return: 0 if the request was admitted, otherwise how many seconds until it would be.
+        """
+        now = time.monotonic()
+        buckets = []
+        if self.guild_rate > 0:
+            buckets.append(self._bucket(self.guilds, guild_id, self.guild_rate, self.guild_burst, now))
+        if self.user_rate > 0:
+            buckets.append(self._bucket(self.users, user_id, self.user_rate, self.user_burst, now))
+
+        retry_after = max((bucket.retry_after() for bucket in buckets), default=0.0)
+        if retry_after:
+            return retry_after
+
+        for bucket in buckets:
+            bucket.tokens -= 1
+        return 0.0
+
+    def _bucket(self, buckets: Dict[Hashable, TokenBucket], key, rate: float, capacity: int, now: float):
+        try:
+            bucket = buckets[key]
+        except KeyError:
+            if len(buckets) >= self.MAX_BUCKETS:
+                self._prune(buckets, now)
+            bucket = buckets[key] = TokenBucket(rate, capacity)
+
+        bucket.refill(now)
+        return bucket
+
+    @staticmethod
+    def _prune(buckets: Dict[Hashable, TokenBucket], now: float):
+        # a full bucket behaves exactly like a new one, so it's safe to forget.
+        for key, bucket in list(buckets.items()):
+            bucket.refill(now)
+            if bucket.full:
+                del buckets[key]
+
+
+class ConcurrencyLimit:
+    """
+    Caps how many of something can run at once across all guilds. Requests over the cap are queued for a while and
+    shed if they still can't get a slot.
+    """
+
+    def __init__(self, limit: int, timeout: float, what: str):
+        """
+        :param limit: Maximum number of concurrent holders. 0 for no limit.
+        :param timeout: How long to queue for a slot before giving up.
+        :param what: What is being limited, for the error message.
+        """
+        self.limit = limit
+        self.timeout = timeout
+        self.what = what
+
+        self._semaphore = asyncio.Semaphore(limit) if limit > 0 else None
+
+    async def acquire(self):
+        if self._semaphore is None:
+            return
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise exceptions.Overloaded(self.what)
+
+    def release(self):
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.release()
@@ -0,0 +1,103 @@
+import logging
+import threading
+from typing import Callable, List
+
+import discord
+from discord.opus import Encoder as OpusEncoder
+
+from .encoding import EncoderSettings
+
+log = logging.getLogger(__name__)
+
+
+class Broadcast:
+    """
+    Decodes and encodes one sound once, and shares the resulting opus packets between any number of voice clients.
+    Whichever listener first needs a frame produces it; the others just read it.
+
+    Packets are kept until every listener is done, since listeners drift apart while reconnecting. Opus is small enough
+    that this is not a concern for sounds.
+    """
+
+    def __init__(
+            self,
+            source: discord.AudioSource,
+            on_close: Callable[[], None] = None,
+            settings: EncoderSettings = None
+    ):
+        """
+        :param source: The PCM source to broadcast. It is cleaned up once every listener is done.
+        :param on_close: Called once every listener is done. May be called from any thread.
+        :param settings: How to encode it. Since every listener gets the same packets, these should suit every channel.
+        """
+        self.source = source
+        self.on_close = on_close
+        self.encoder = settings.encoder() if settings is not None else OpusEncoder()
+        self.packets: List[bytes] = []
+        self.finished = False
+        self.listeners = 0
+        self.lock = threading.Lock()
+
+    def listen(self) -> 'FanoutSource':
+        """
+        :return: A new source that plays the broadcast from the start.
+        """
+        with self.lock:
+            self.listeners += 1
+        return FanoutSource(self)
+
+    def packet(self, index: int) -> bytes:
+        with self.lock:
+            while len(self.packets) <= index and not self.finished:
+                pcm = self.source.read()
+                if len(pcm) != OpusEncoder.FRAME_SIZE:
+                    self.finished = True
+                    break
+                self.packets.append(self.encoder.encode(pcm, OpusEncoder.SAMPLES_PER_FRAME))
+
+            if index < len(self.packets):
+                return self.packets[index]
+            return b''
+
+    def close(self):
+        """
+        Stop producing and clean up the source. Called once the last listener is done, or if nobody ever listened.
+        """
+        with self.lock:
+            self.finished = True
+            self.packets.clear()
+        self.source.cleanup()
+        if self.on_close is not None:
+            self.on_close()
+
+    def _leave(self):
+        with self.lock:
+            self.listeners -= 1
+            done = self.listeners == 0
+        if done:
+            self.close()
+
+
+class FanoutSource(discord.AudioSource):
+    """
+    One listener's view of a broadcast.
+    """
+
+    def __init__(self, broadcast: Broadcast):
+        self.broadcast = broadcast
+        self.index = 0
+        self.closed = False
+
+    def read(self):
+        data = self.broadcast.packet(self.index)
+        self.index += 1
+        return data
+
+    def is_opus(self):
+        return True
+
+    def cleanup(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.broadcast._leave()
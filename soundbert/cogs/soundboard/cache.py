@@ -0,0 +1,243 @@
+import logging
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+
+import discord
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    admissions: int = 0
+    rejections: int = 0
+    evictions: int = 0
+    entries: int = 0
+    size: int = 0
+    max_size: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class AudioCache:
+    """
+    Size-bounded cache of decoded PCM audio, keyed by sound id.
+
+    Entries are evicted in LRU order, but a new entry is only admitted if it has been requested more often than the
+    entries it would evict (TinyLFU-style admission), so a burst of one-off plays cannot flush the popular sounds.
+    Request frequencies are halved periodically so that sounds that used to be popular eventually age out.
+
+    Audio being decoded is buffered until it is complete, and only if it stands a chance of being admitted. Those
+    buffers are kept to a quarter of the budget between them, on top of the budget itself.
+
+    All methods are thread-safe, since entries are filled in from the audio player threads.
+    """
+
+    # how many lookups between halving all frequencies.
+    AGING_PERIOD = 10000
+
+    def __init__(self, max_size: int, max_entry_size: int = None):
+        """
+        :param max_size: Memory budget in bytes.
+        :param max_entry_size: Largest single entry in bytes. Defaults to an eighth of the budget.
+        """
+        self.max_size = max_size
+        self.max_entry_size = max_size // 8 if max_entry_size is None else max_entry_size
+
+        self.max_buffered = max_size // 4
+
+        self._entries: 'OrderedDict[int, bytes]' = OrderedDict()
+        self._frequencies = Counter()
+        self._lookups = 0
+        self._size = 0
+        self._buffered = 0
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._admissions = 0
+        self._rejections = 0
+        self._evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get(self, sound_id: int):
+        """
+        Get the decoded audio for a sound, and count the request towards its frequency.
+
+        :param sound_id: The sound id.
+        :return: The PCM data, or None if it is not cached.
+        """
+        with self._lock:
+            self._frequencies[sound_id] += 1
+            self._lookups += 1
+            if self._lookups >= self.AGING_PERIOD:
+                self._age()
+
+            try:
+                pcm = self._entries[sound_id]
+            except KeyError:
+                self._misses += 1
+                return None
+
+            self._entries.move_to_end(sound_id)
+            self._hits += 1
+            return pcm
+
+    def put(self, sound_id: int, pcm: bytes):
+        """
+        Offer decoded audio to the cache. It is only stored if it fits and is requested more often than whatever would
+        have to be evicted to make room for it.
+
+        :param sound_id: The sound id.
+        :param pcm: The PCM data.
+        """
+        size = len(pcm)
+        if size > self.max_entry_size:
+            return
+
+        with self._lock:
+            if sound_id in self._entries:
+                return
+
+            frequency = self._frequencies[sound_id]
+            victims = []
+            freed = 0
+            for victim in self._entries:
+                if self._size - freed + size <= self.max_size:
+                    break
+                if self._frequencies[victim] >= frequency:
+                    self._rejections += 1
+                    return
+                victims.append(victim)
+                freed += len(self._entries[victim])
+
+            for victim in victims:
+                self._remove(victim)
+                self._evictions += 1
+
+            self._entries[sound_id] = pcm
+            self._size += size
+            self._admissions += 1
+
+    def admissible(self, sound_id: int) -> bool:
+        """
+        Whether decoded audio for a sound could be admitted right now, which is what makes it worth buffering.
+        """
+        with self._lock:
+            if sound_id in self._entries:
+                return False
+            if self._size + self.max_entry_size <= self.max_size:
+                return True
+            # the least recently used entry is the first that would have to go.
+            victim = next(iter(self._entries), None)
+            return victim is None or self._frequencies[victim] < self._frequencies[sound_id]
+
+    def reserve(self, size: int) -> bool:
+        """
+        Account for audio being buffered on its way into the cache.
+
+        :param size: Bytes about to be buffered.
+        :return: Whether there is room for them. If not, the buffer should be dropped.
+        """
+        with self._lock:
+            if self._buffered + size > self.max_buffered:
+                return False
+            self._buffered += size
+            return True
+
+    def release(self, size: int):
+        """
+        Give back buffer space taken with reserve.
+        """
+        with self._lock:
+            self._buffered -= size
+
+    def invalidate(self, sound_id: int):
+        """
+        Drop a sound from the cache, e.g. because it was renamed or deleted.
+
+        :param sound_id: The sound id.
+        """
+        with self._lock:
+            self._remove(sound_id)
+            self._frequencies.pop(sound_id, None)
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                    hits=self._hits,
+                    misses=self._misses,
+                    admissions=self._admissions,
+                    rejections=self._rejections,
+                    evictions=self._evictions,
+                    entries=len(self._entries),
+                    size=self._size,
+                    max_size=self.max_size
+            )
+
+    def _remove(self, sound_id: int):
+        pcm = self._entries.pop(sound_id, None)
+        if pcm is not None:
+            self._size -= len(pcm)
+
+    def _age(self):
+        self._lookups = 0
+        for sound_id, frequency in list(self._frequencies.items()):
+            if frequency > 1:
+                self._frequencies[sound_id] = frequency // 2
+            else:
+                del self._frequencies[sound_id]
+
+
+class CachingSource(discord.AudioSource):
+    """
+    Passes audio through from another source, and offers it to the cache once it has been read to the end.
+    """
+
+    def __init__(self, source: discord.AudioSource, cache: AudioCache, sound_id: int):
+        self.source = source
+        self.cache = cache
+        self.sound_id = sound_id
+
+        # sounds that would be turned away anyway aren't buffered at all.
+        self._frames = [] if cache.admissible(sound_id) else None
+        # bytes reserved in the cache's buffer allowance.
+        self._size = 0
+
+    def read(self):
+        frame = self.source.read()
+
+        if self._frames is not None:
+            if not frame:
+                log.debug(f'Offering sound {self.sound_id} to the audio cache.')
+                pcm = b''.join(self._frames)
+                self._drop()
+                self.cache.put(self.sound_id, pcm)
+            elif self._size + len(frame) > self.cache.max_entry_size or not self.cache.reserve(len(frame)):
+                # too big to ever be cached, or too much is being buffered already, so stop holding on to it.
+                self._drop()
+            else:
+                self._size += len(frame)
+                self._frames.append(frame)
+
+        return frame
+
+    def cleanup(self):
+        self._drop()
+        self.source.cleanup()
+
+    def _drop(self):
+        self._frames = None
+        if self._size:
+            self.cache.release(self._size)
+            self._size = 0
+
@@ -1,6 +1,5 @@
 import discord
 from discord.ext import commands
-from sqlalchemy import select
 
 from . import exceptions
 from ...database import guilds
@@ -9,15 +8,13 @@ from ...database import guilds
 async def is_soundmaster(ctx: commands.Context):
     if await ctx.bot.is_owner(ctx.author):
         return True
-    if ctx.guild.owner == ctx.author:
+    if ctx.guild.owner_id == ctx.author.id:
         return True
     if ctx.author.guild_permissions.manage_guild:
         return True
 
-    soundmaster = await ctx.bot.db.fetch_val(
-        select([guilds.c.soundmaster])
-            .where(guilds.c.id == ctx.guild.id)
-    )
+    settings = await ctx.bot.guild_settings(ctx.guild.id)
+    soundmaster = settings[guilds.c.soundmaster]
 
     if soundmaster is None:
         return True
@@ -33,10 +30,8 @@ async def is_soundplayer(ctx: commands.Context):
     if await is_soundmaster(ctx):
         return True
 
-    soundplayer = await ctx.bot.db.fetch_val(
-        select([guilds.c.soundplayer])
-            .where(guilds.c.id == ctx.guild.id)
-    )
+    settings = await ctx.bot.guild_settings(ctx.guild.id)
+    soundplayer = settings[guilds.c.soundplayer]
 
     if soundplayer is None:
         return True
@@ -51,4 +46,11 @@ async def is_soundplayer(ctx: commands.Context):
 async def is_in_voice(ctx: commands.Context):
     if not hasattr(ctx.author, 'voice'):
         raise exceptions.NoChannel()
-    return True
\ No newline at end of file
+    return True
+
+
+async def is_admitted(ctx: commands.Context):
+    retry_after = ctx.cog.admission.admit(ctx.guild.id, ctx.author.id)
+    if retry_after:
+        raise exceptions.RateLimited(retry_after)
+    return True
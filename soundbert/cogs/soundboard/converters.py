@@ -11,6 +11,8 @@ from ...database import sounds, sound_names
 
 log = logging.getLogger(__name__)
 
+_validator = FileNameValidator()
+
 
 class SoundConverter(commands.Converter):
     def __init__(self, columns):
@@ -50,6 +52,33 @@ class ExistingSound(SoundConverter):
         return sound
 
 
+def validate_name(name: str) -> str:
+    """
+    Ensure that a new sound name is valid.
+
+    :param name: The name.
+    :return: The name, sanitized.
+    :raises exceptions.InvalidSoundName: If the name is not valid.
+    """
+    try:
+        _validator.validate(name)
+    except ValidationError as e:
+        if isinstance(e, InvalidLengthError):
+            raise exceptions.InvalidSoundName(
+                    f'Sound names must be between 1 and {_validator.max_len} characters in length.')
+        elif isinstance(e, InvalidCharError):
+            sanitized = pathvalidate.sanitize_filename(name)
+            invalid = set(name) - set(sanitized)
+
+            raise exceptions.InvalidSoundName(f'Sound name contains invalid characters: `{invalid}`')
+        elif isinstance(e, ReservedNameError):
+            raise exceptions.InvalidSoundName(f'Sounds cannot be named `{e.reserved_name}`.')
+        else:
+            raise exceptions.InvalidSoundName()
+
+    return pathvalidate.sanitize_filename(name)
+
+
 class NewSound(SoundConverter):
     """
     Converter that ensures that a new sound name is valid.
@@ -57,31 +86,19 @@ class NewSound(SoundConverter):
 
     def __init__(self):
         super().__init__([exists([1])])
-        self.validator = FileNameValidator()
 
     async def convert(self, ctx: commands.Context, name):
 
         try:
-            self.validator.validate(name)
-        except ValidationError as e:
+            sanitized = validate_name(name)
+        except exceptions.InvalidSoundName:
             log.exception(f'{ctx.author} (id={ctx.author.id}) tried to add sound {name}, which is invalid.')
-            if isinstance(e, InvalidLengthError):
-                raise exceptions.InvalidSoundName(
-                        f'Sound names must be between 1 and {self.validator.max_len} characters in length.')
-            elif isinstance(e, InvalidCharError):
-                sanitized = pathvalidate.sanitize_filename(name)
-                invalid = set(name) - set(sanitized)
-
-                raise exceptions.InvalidSoundName(f'Sound name contains invalid characters: `{invalid}`')
-            elif isinstance(e, ReservedNameError):
-                raise exceptions.InvalidSoundName(f'Sounds cannot be named `{e.reserved_name}`.')
-            else:
-                raise exceptions.InvalidSoundName()
+            raise
 
         exists = await super(NewSound, self).convert(ctx, name)
         if exists:
             raise exceptions.SoundExists(name)
-        return pathvalidate.sanitize_filename(name)
+        return sanitized
 
 
 class PlaybackArgumentConverter(commands.Converter):
@@ -0,0 +1,358 @@
+import collections
+import itertools
+import logging
+import multiprocessing
+import queue
+import threading
+from dataclasses import dataclass
+from multiprocessing.connection import Connection
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Iterable, List, Optional
+
+import discord
+from discord.opus import Encoder as OpusEncoder
+
+log = logging.getLogger(__name__)
+
+# each slot holds one frame of PCM followed by room for its encoded opus packet, which is never larger.
+SLOT_SIZE = 2 * OpusEncoder.FRAME_SIZE
+# how many frames each stream may have in flight.
+DEPTH = 4
+# the range of bitrates opus encodes at, in kbps.
+MIN_BITRATE = 16
+MAX_BITRATE = 512
+# seconds to wait for a worker to encode a frame before giving up on it. frames are read ahead, so a healthy worker
+# answers well within one frame.
+REPLY_TIMEOUT = 0.5
+
+
+@dataclass(frozen=True)
+class EncoderSettings:
+    """
+    How to encode a stream for the voice channels it is sent to.
+    """
+
+    # kbps.
+    bitrate: int = 128
+    fec: bool = True
+    # expected fraction of packets lost.
+    packet_loss: float = 0.15
+
+    @classmethod
+    def for_channels(
+            cls,
+            channels: Iterable[discord.VoiceChannel],
+            max_bitrate: int = 128,
+            packet_loss: float = 0.15
+    ) -> 'EncoderSettings':
+        """
+        Encode at the bitrate of the channels, since anything more is wasted on listeners whose clients are limited
+        to it anyway. Shared streams go at the lowest bitrate among their channels.
+
+        :param channels: The channels the stream is sent to.
+        :param max_bitrate: The highest bitrate to encode at in kbps, which is also used for channels whose bitrate is
+                            unknown.
+        :param packet_loss: Expected fraction of packets lost. Forward error correction is on unless this is 0.
+        """
+        bitrates = [getattr(channel, 'bitrate', None) for channel in channels]
+        bitrate = min((b // 1000 for b in bitrates if b), default=max_bitrate)
+        bitrate = max(MIN_BITRATE, min(bitrate, max_bitrate, MAX_BITRATE))
+        return cls(bitrate=bitrate, fec=packet_loss > 0, packet_loss=packet_loss)
+
+    def apply(self, encoder: OpusEncoder):
+        """
+        Configure an encoder. Don't reconfigure an encoder that is in use; opus encoders are not thread safe.
+        """
+        encoder.set_bitrate(self.bitrate)
+        encoder.set_fec(self.fec)
+        encoder.set_expected_packet_loss_percent(self.packet_loss)
+
+    def encoder(self) -> OpusEncoder:
+        """
+        :return: A new encoder with these settings.
+        """
+        encoder = OpusEncoder()
+        self.apply(encoder)
+        return encoder
+
+
+def _work(conn: Connection):
+    """
+    Worker process main loop. Each stream gets its own encoder, since opus encoders carry state between frames.
+    """
+    encoders = {}
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+
+        kind, stream_id, *args = message
+        if kind == 'stop':
+            break
+        try:
+            _handle(conn, encoders, kind, stream_id, args)
+        except BrokenPipeError:
+            # the main process is gone.
+            break
+
+
+def _handle(conn: Connection, encoders: Dict, kind: str, stream_id: Optional[int], args: List):
+    if kind == 'encode':
+        slot, = args
+        try:
+            encoder, shm = encoders[stream_id]
+        except KeyError:
+            # the stream failed to open. its reader is waiting for an answer all the same.
+            conn.send((stream_id, slot, -1))
+            return
+        offset = slot * SLOT_SIZE
+        try:
+            pcm = bytes(shm.buf[offset:offset + OpusEncoder.FRAME_SIZE])
+            data = encoder.encode(pcm, OpusEncoder.SAMPLES_PER_FRAME)
+        except Exception:
+            log.exception(f'Failed to encode a frame of stream {stream_id}.')
+            conn.send((stream_id, slot, -1))
+            return
+        offset += OpusEncoder.FRAME_SIZE
+        shm.buf[offset:offset + len(data)] = data
+        conn.send((stream_id, slot, len(data)))
+    elif kind == 'open':
+        shm_name, settings = args
+        try:
+            encoder = settings.encoder() if settings is not None else OpusEncoder()
+            # the main process owns the memory and unlinks it when the stream is done.
+            encoders[stream_id] = (encoder, SharedMemory(name=shm_name))
+        except Exception:
+            log.exception(f'Failed to open stream {stream_id}.')
+            conn.send((stream_id, None, -1))
+    elif kind == 'close':
+        try:
+            _, shm = encoders.pop(stream_id)
+        except KeyError:
+            return
+        shm.close()
+
+
+class _Worker:
+    def __init__(self, context, index: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+                target=_work,
+                args=(child_conn,),
+                daemon=True,
+                name=f'soundbert-encoder-{index}'
+        )
+        self.process.start()
+        child_conn.close()
+
+        self.send_lock = threading.Lock()
+        self.streams: Dict[int, queue.Queue] = {}
+
+        self.router = threading.Thread(target=self._route, daemon=True, name=f'soundbert-encoder-{index}-replies')
+        self.router.start()
+
+    @property
+    def alive(self) -> bool:
+        return self.router.is_alive() and self.process.is_alive()
+
+    def send(self, message):
+        with self.send_lock:
+            self.conn.send(message)
+
+    def close(self):
+        try:
+            self.send(('stop', None))
+        except OSError:
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.terminate()
+        # the worker closing its end of the pipe stops the router.
+        self.router.join(timeout=1)
+        self.conn.close()
+
+    def _route(self):
+        while True:
+            try:
+                stream_id, slot, length = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            replies = self.streams.get(stream_id)
+            if replies is not None:
+                replies.put((slot, length))
+
+        self.process.join(timeout=1)
+        if self.process.exitcode:
+            log.error(f'Encoder process {self.process.name} died with exit code {self.process.exitcode}.')
+        # nothing more is coming, so wake up every stream that is still waiting.
+        for replies in list(self.streams.values()):
+            replies.put((None, -1))
+
+
+class EncoderPool:
+    """
+    Encodes audio to opus in a pool of worker processes, so that encoding for many concurrent streams can use more than
+    one core. Frames are passed through shared memory, and only slot numbers go over the pipes. Each stream is pinned
+    to one worker, which keeps its encoder.
+    """
+
+    def __init__(self, processes: int):
+        # forking a process that runs an event loop and several threads is asking for trouble.
+        context = multiprocessing.get_context('spawn')
+        self.workers: List[_Worker] = [_Worker(context, i) for i in range(processes)]
+        self._ids = itertools.count()
+
+    def encode(self, source: discord.AudioSource, settings: EncoderSettings = None) -> discord.AudioSource:
+        """
+        Wrap a PCM source so that it is encoded by the pool.
+
+        :param source: The PCM source.
+        :param settings: How to encode it. Defaults to discord.py's settings.
+        :return: An opus source, or the PCM source itself to be encoded locally if every worker has died.
+        """
+        workers = [worker for worker in self.workers if worker.alive]
+        if not workers:
+            log.warning('No encoder processes are left, encoding locally.')
+            return source
+        worker = min(workers, key=lambda worker: len(worker.streams))
+        return EncodingSource(worker, next(self._ids), source, settings)
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
+
+
+class EncodingSource(discord.AudioSource):
+    """
+    Opus source that reads PCM from another source and has it encoded by a worker process. A few frames are kept in
+    flight, so the worker is encoding ahead of playback rather than in lockstep with it.
+
+    If the worker fails or dies, the rest of the stream is encoded locally, starting with the frames that were in
+    flight.
+    """
+
+    def __init__(
+            self,
+            worker: _Worker,
+            stream_id: int,
+            source: discord.AudioSource,
+            settings: Optional[EncoderSettings] = None
+    ):
+        self.worker = worker
+        self.stream_id = stream_id
+        self.source = source
+        self.settings = settings
+
+        self.shm = SharedMemory(create=True, size=DEPTH * SLOT_SIZE)
+        self.free = collections.deque(range(DEPTH))
+        self.pending = collections.deque()
+        self.replies = queue.Queue()
+        self.exhausted = False
+        self.closed = False
+        # set once the worker has failed, along with the frames it had not encoded.
+        self.encoder: Optional[OpusEncoder] = None
+        self.backlog = collections.deque()
+
+        worker.streams[stream_id] = self.replies
+        try:
+            worker.send(('open', stream_id, self.shm.name, settings))
+        except OSError:
+            # the worker died since it was chosen. the first frame finds out and falls back.
+            pass
+
+    def read(self):
+        if self.encoder is not None:
+            return self._read_locally()
+
+        while self.free and not self.exhausted:
+            pcm = self.source.read()
+            if len(pcm) != OpusEncoder.FRAME_SIZE:
+                self.exhausted = True
+                break
+
+            slot = self.free.popleft()
+            offset = slot * SLOT_SIZE
+            self.shm.buf[offset:offset + OpusEncoder.FRAME_SIZE] = pcm
+            self.pending.append(slot)
+            try:
+                self.worker.send(('encode', self.stream_id, slot))
+            except OSError:
+                log.warning(f'Encoder process {self.worker.process.name} is gone.')
+                return self._fall_back()
+
+        if not self.pending:
+            return b''
+
+        # a stream's frames are encoded by one worker in order, so replies come back in order too.
+        try:
+            slot, length = self.replies.get(timeout=REPLY_TIMEOUT)
+        except queue.Empty:
+            log.warning(f'Encoder process {self.worker.process.name} timed out on stream {self.stream_id}.')
+            return self._fall_back()
+        if length < 0:
+            return self._fall_back()
+        self.pending.popleft()
+
+        offset = slot * SLOT_SIZE + OpusEncoder.FRAME_SIZE
+        data = bytes(self.shm.buf[offset:offset + length])
+        self.free.append(slot)
+        return data
+
+    def _fall_back(self) -> bytes:
+        log.warning(f'Encoding stream {self.stream_id} locally.')
+        self._detach()
+        # the frames in flight are still in shared memory.
+        self.backlog.extend(
+                bytes(self.shm.buf[slot * SLOT_SIZE:slot * SLOT_SIZE + OpusEncoder.FRAME_SIZE])
+                for slot in self.pending
+        )
+        self.pending.clear()
+        try:
+            self.encoder = self.settings.encoder() if self.settings is not None else OpusEncoder()
+        except Exception:
+            log.exception(f'Failed to encode stream {self.stream_id} locally.')
+            self.exhausted = True
+            return b''
+        return self._read_locally()
+
+    def _read_locally(self) -> bytes:
+        if self.backlog:
+            pcm = self.backlog.popleft()
+        elif self.exhausted:
+            return b''
+        else:
+            pcm = self.source.read()
+            if len(pcm) != OpusEncoder.FRAME_SIZE:
+                self.exhausted = True
+                return b''
+
+        try:
+            return self.encoder.encode(pcm, OpusEncoder.SAMPLES_PER_FRAME)
+        except Exception:
+            log.exception(f'Failed to encode a frame of stream {self.stream_id}.')
+            self.exhausted = True
+            self.backlog.clear()
+            return b''
+
+    def _detach(self):
+        if self.worker.streams.pop(self.stream_id, None) is None:
+            return
+        try:
+            self.worker.send(('close', self.stream_id))
+        except OSError:
+            pass
+
+    def is_opus(self):
+        return True
+
+    def cleanup(self):
+        if self.closed:
+            return
+        self.closed = True
+
+        self.source.cleanup()
+        self._detach()
+        self.shm.close()
+        self.shm.unlink()
@@ -29,6 +29,16 @@ class SoundExists(commands.BadArgument):
         super(SoundExists, self).__init__(f'Sound `{name}` already exists.')
 
 
+class NoMatches(commands.BadArgument):
+    def __init__(self, patterns):
+        super(NoMatches, self).__init__(f'No sounds match `{" ".join(patterns)}`.')
+
+
+class BadPattern(commands.BadArgument):
+    def __init__(self, pattern):
+        super(BadPattern, self).__init__(f'`{pattern}` is not a valid regular expression.')
+
+
 class AliasTargetIsAlias(commands.BadArgument):
     def __init__(self):
         super(AliasTargetIsAlias, self).__init__('Cannot create alias of an alias.')
@@ -53,6 +63,11 @@ class BadPlaybackRange(commands.UserInputError):
         super(BadPlaybackRange, self).__init__(f'{arg.capitalize()} must be between {min} and {max}.')
 
 
+class NoBroadcastTargets(commands.BadArgument):
+    def __init__(self):
+        super(NoBroadcastTargets, self).__init__('None of those are voice channels that are free to play in.')
+
+
 class NoDownload(commands.BadArgument):
     def __init__(self):
         super(NoDownload, self).__init__('Download link or file attachment required.')
@@ -71,3 +86,16 @@ class NoSounds(commands.CommandError):
 class InvalidSoundName(commands.CommandError):
     def __init__(self, message='Invalid sound name.', *args: object):
         super(InvalidSoundName, self).__init__(message=message, *args)
+
+
+class RateLimited(commands.CheckFailure):
+    def __init__(self, retry_after: float):
+        super(RateLimited, self).__init__(
+                f'Slow down! Try again in {retry_after:.1f} seconds.',
+                max(int(retry_after) + 1, 5)
+        )
+
+
+class Overloaded(commands.CheckFailure):
+    def __init__(self, what):
+        super(Overloaded, self).__init__(f'Too many {what} right now. Try again in a bit.')
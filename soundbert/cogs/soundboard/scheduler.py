@@ -0,0 +1,221 @@
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import discord
+from discord import VoiceClient
+from discord.opus import Encoder as OpusEncoder
+
+log = logging.getLogger(__name__)
+
+# seconds per frame.
+FRAME_LENGTH = OpusEncoder.FRAME_LENGTH / 1000
+# if a shard falls this far behind, skip ahead instead of trying to catch up.
+MAX_LAG = 0.2
+
+
+@dataclass
+class SchedulerStats:
+    threads: int
+    streams: int
+    ticks: int
+    mean_lateness: float
+    max_lateness: float
+
+
+class _Stream:
+    def __init__(self, vclient: VoiceClient, source: discord.AudioSource, after: Optional[Callable]):
+        self.vclient = vclient
+        self.source = source
+        self.after = after
+        self.encode = not source.is_opus()
+
+
+class _Shard(threading.Thread):
+    """
+    One timing loop, sending audio for some of the active streams.
+    """
+
+    def __init__(self, scheduler: 'AudioScheduler', index: int):
+        super(_Shard, self).__init__(daemon=True, name=f'soundbert-audio-{index}')
+        self.scheduler = scheduler
+        self.streams: Dict[int, _Stream] = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+
+        self.ticks = 0
+        self.total_lateness = 0.0
+        self.max_lateness = 0.0
+
+    def run(self):
+        next_tick = time.perf_counter()
+        while True:
+            if not self.streams:
+                self.wakeup.wait()
+                self.wakeup.clear()
+                next_tick = time.perf_counter()
+                continue
+
+            lateness = time.perf_counter() - next_tick
+            self.ticks += 1
+            self.total_lateness += lateness
+            self.max_lateness = max(self.max_lateness, lateness)
+
+            self._tick()
+
+            next_tick += FRAME_LENGTH
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif -delay > MAX_LAG:
+                log.debug(f'{self.name} fell {-delay:.3f}s behind; skipping ahead.')
+                next_tick = time.perf_counter()
+
+    def _tick(self):
+        with self.lock:
+            streams = list(self.streams.values())
+
+        # read every frame first and then send them all, so slow reads don't spread the sends out.
+        frames = []
+        finished = []
+        for stream in streams:
+            # paused while the voice connection is reconnecting.
+            if not stream.vclient.is_connected():
+                continue
+            # a stream whose source was replaced while it was being read isn't finished; the new one just starts.
+            source = stream.source
+            try:
+                data = source.read()
+            except Exception as e:
+                if stream.source is source:
+                    finished.append((stream, e))
+                continue
+            if data:
+                frames.append((stream, data))
+            elif stream.source is source:
+                finished.append((stream, None))
+
+        for stream, data in frames:
+            try:
+                stream.vclient.send_audio_packet(data, encode=stream.encode)
+            except Exception as e:
+                finished.append((stream, e))
+
+        for stream, error in finished:
+            self.scheduler._finish(stream, error)
+
+
+class AudioScheduler:
+    """
+    Sends audio for every playing voice client from a small, fixed pool of threads, instead of discord.py's one player
+    thread per voice client. Each thread runs a single 20 ms timing loop over its share of the streams.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, threads: int = 1):
+        self.loop = loop
+        self.shards: List[_Shard] = [_Shard(self, i) for i in range(threads)]
+        for shard in self.shards:
+            shard.start()
+
+    def play(self, vclient: VoiceClient, source: discord.AudioSource, *, after: Callable = None):
+        """
+        Start playing a source on a voice client. Must be called from the event loop.
+
+        :param vclient: The voice client.
+        :param source: The source.
+        :param after: Called with an exception or None when the source finishes or is stopped. Called from an
+                      executor thread, like discord.py's own after callback is called from the player thread.
+        """
+        if self.is_playing(vclient):
+            raise discord.ClientException('Already playing audio.')
+
+        self._set_up_encoder(vclient, source)
+
+        stream = _Stream(vclient, source, after)
+        shard = min(self.shards, key=lambda shard: len(shard.streams))
+        with shard.lock:
+            shard.streams[vclient.guild.id] = stream
+        shard.wakeup.set()
+
+        self.loop.create_task(vclient.ws.speak(True))
+
+    def stop(self, vclient: VoiceClient):
+        """
+        Stop playing on a voice client, if anything is playing.
+
+        :param vclient: The voice client.
+        """
+        for shard in self.shards:
+            stream = shard.streams.get(vclient.guild.id)
+            if stream is not None and stream.vclient is vclient:
+                self._finish(stream, None)
+
+    def replace(self, vclient: VoiceClient, source: discord.AudioSource) -> discord.AudioSource:
+        """
+        Swap the source a voice client is playing, from the next frame on. The after callback stays the same.
+
+        :param vclient: The voice client.
+        :param source: The new source.
+        :return: The old source, which is not cleaned up.
+        """
+        for shard in self.shards:
+            with shard.lock:
+                stream = shard.streams.get(vclient.guild.id)
+                if stream is not None and stream.vclient is vclient:
+                    self._set_up_encoder(vclient, source)
+                    old = stream.source
+                    stream.source = source
+                    stream.encode = not source.is_opus()
+                    return old
+
+        raise discord.ClientException('Not playing audio.')
+
+    @staticmethod
+    def _set_up_encoder(vclient: VoiceClient, source: discord.AudioSource):
+        # like VoiceClient.play, only pcm sources need an encoder. opus sources are sent as they are, so they don't
+        # need libopus in this process at all.
+        if vclient.encoder is None and not source.is_opus():
+            vclient.encoder = discord.opus.Encoder()
+
+    def is_playing(self, vclient: VoiceClient) -> bool:
+        return any(vclient.guild.id in shard.streams for shard in self.shards)
+
+    def stats(self) -> SchedulerStats:
+        ticks = sum(shard.ticks for shard in self.shards)
+        total_lateness = sum(shard.total_lateness for shard in self.shards)
+        return SchedulerStats(
+                threads=threading.active_count(),
+                streams=sum(len(shard.streams) for shard in self.shards),
+                ticks=ticks,
+                mean_lateness=total_lateness / ticks if ticks else 0.0,
+                max_lateness=max(shard.max_lateness for shard in self.shards)
+        )
+
+    def _finish(self, stream: _Stream, error: Optional[Exception]):
+        for shard in self.shards:
+            with shard.lock:
+                if shard.streams.get(stream.vclient.guild.id) is stream:
+                    del shard.streams[stream.vclient.guild.id]
+                    break
+        else:
+            # already finished.
+            return
+
+        if error is not None:
+            log.error(f'Error while playing audio in guild {stream.vclient.guild.id}.', exc_info=error)
+
+        def cleanup():
+            stream.source.cleanup()
+            if stream.after is not None:
+                try:
+                    stream.after(error)
+                except Exception:
+                    log.exception('Calling the after function failed.')
+
+        # cleaning up and the after callback can both block, so neither may run on a shard thread.
+        self.loop.call_soon_threadsafe(self.loop.run_in_executor, None, cleanup)
+        if stream.vclient.is_connected():
+            asyncio.run_coroutine_threadsafe(stream.vclient.ws.speak(False), self.loop)
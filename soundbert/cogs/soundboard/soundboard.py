@@ -1,31 +1,57 @@
 import asyncio
+import fnmatch
+import io
+import json
 import logging
+import re
 import shutil
 import tempfile
-from collections import namedtuple
+from collections import OrderedDict, namedtuple
+from functools import partial
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Match, Optional, Tuple
 
 import aiohttp
-import asyncpg
 import discord
-import youtube_dl
 from discord import VoiceClient, VoiceChannel
 from discord.ext import commands
-from sqlalchemy import and_, select, func, true
+from sqlalchemy import and_, case, or_, select, func, true
 
 from . import exceptions
-from .checks import is_soundmaster, is_soundplayer, is_in_voice
-from .converters import ExistingSound, NewSound, PlaybackArgumentConverter
+from .admission import Admission, ConcurrencyLimit
+from .broadcast import Broadcast
+from .cache import AudioCache, CachingSource
+from .checks import is_admitted, is_soundmaster, is_soundplayer, is_in_voice
+from .converters import ExistingSound, NewSound, PlaybackArgumentConverter, validate_name
+from .encoding import EncoderPool, EncoderSettings
+from .scheduler import AudioScheduler
+from .sources import PrebufferedSource
+from .voice import GuildVoice
+from ..utils.archive import ArchiveMember, TarStream
 from ..utils.humantime import humanduration, TimeUnits
 from ..utils.paginator import DictionaryPaginator
 from ..utils.pluralize import pluralize
 from ..utils.reactions import ok
-from ...database import sounds, sound_names
+from ...database import UniqueViolation, is_sqlite, sounds, sound_names
+from ...normalize import Normalizer
+from ...querycount import query_budget
 from ...soundbert import SoundBert
+from ...storage import Storage
 
 log = logging.getLogger(__name__)
 
+MANIFEST_NAME = 'soundbert.json'
+# room left in each upload for the multipart envelope around the archive.
+UPLOAD_OVERHEAD = 1 << 16  # 64 KB
+# seconds between background normalizer runs.
+NORMALIZE_PERIOD = 60 * 60
+# how many guilds' rendered !list pages are kept, least recently listed first out.
+LIST_CACHE_GUILDS = 256
+# seconds to wait for a bulk delete to be confirmed.
+CONFIRM_TIMEOUT = 30
+# how many names a bulk delete lists when asking for confirmation.
+CONFIRM_LIST_LIMIT = 50
+
 PlaybackArgument = namedtuple('PlaybackArgument', ['volume', 'speed', 'seek'])
 _DEFAULT_PLAYBACK_ARGUMENTS = PlaybackArgument(1.0, None, None)
 
@@ -36,80 +62,133 @@ class Playback:
             ctx: commands.Context,
             sound_id: int,
             name: str,
-            sound_path: Path,
+            storage: Storage,
             volume=1.0,
             speed=None,
-            seek=None
+            seek=None,
+            cache: AudioCache = None,
+            decoders: ConcurrencyLimit = None,
+            encoders: EncoderPool = None
     ):
         self.ctx = ctx
         self.sound_id = sound_id
         self.name = name
-        self.sound_path = sound_path
+        self.storage = storage
         self.volume = volume
         self.speed = speed
         self.seek = seek
+        self.cache = cache
+        self.decoders = decoders
+        self._holds_decoder = False
+        self.encoders = encoders
 
         self.vclient: Optional[VoiceClient] = None
         self.vchannel = ctx.author.voice.channel
 
-    async def connect(self, channel: VoiceChannel):
-        log.debug('Connecting to voice channel.')
-        self.vclient: VoiceClient = self.ctx.guild.voice_client or await channel.connect()
-        await self.vclient.move_to(channel)
+    async def play(self, voice: GuildVoice):
+        """
+        Play the sound. Whatever the guild is already playing is replaced.
 
-    async def play(self):
+        :param voice: The guild's voice connection.
+        """
         log.debug(
                 f'Playing sound {self.name} ({self.sound_id}) '
                 f'in #{self.vchannel.name} ({self.vchannel.id}) '
                 f'of guild {self.ctx.guild.name} ({self.ctx.guild.id}).'
         )
 
-        await self.connect(self.ctx.author.voice.channel)
+        source = self._cached_source()
+        if source is None:
+            await self._acquire_decoder()
+
+        # connecting to voice takes a few round trips, so start up the decoder in the meantime.
+        connecting = asyncio.ensure_future(voice.join(self.vchannel))
+        try:
+            if source is None:
+                file = await self.storage.fetch(self.ctx.guild.id, self.name)
+                source = await self.ctx.bot.loop.run_in_executor(None, self._warm_source, file)
+        except BaseException:
+            self._release_decoder()
+            await self._abandon(connecting, voice)
+            raise
+
+        try:
+            self.vclient = await connecting
+
+            config = self.ctx.bot.config
+            settings = EncoderSettings.for_channels([self.vchannel], config.opus_max_bitrate, config.opus_packet_loss)
+
+            source = discord.PCMVolumeTransformer(source, volume=self.volume if self.volume else 1.0)
+            if self.encoders is not None:
+                source = self.encoders.encode(source, settings)
+
+            await voice.start(self, source, self.vchannel, settings=settings)
+        except BaseException:
+            source.cleanup()
+            self._release_decoder()
+            raise
+
+        # a single statement needs no transaction, and is only counted once playback has actually started.
+        await self.ctx.bot.db.execute(
+                sounds.update()
+                    .values(played=sounds.c.played + 1)
+                    .where(sounds.c.id == self.sound_id)
+        )
+
+    def finished(self):
+        """
+        Called by the guild's voice connection once this playback's audio is done, stopped or replaced.
+        """
+        self._release_decoder()
+
+    async def _abandon(self, connecting: asyncio.Future, voice: GuildVoice):
+        # cancelling a voice handshake half way through can leave the voice client in a broken state, so let it
+        # finish and then disconnect if there is nothing else to play.
+        try:
+            await connecting
+        except Exception:
+            return
+        await voice.leave_if_idle()
+
+    @property
+    def _cacheable(self):
+        # only unaltered sounds are cached; volume is applied afterwards, so it doesn't matter.
+        return self.cache is not None and self.cache.enabled and not self.seek and not self.speed
+
+    def _cached_source(self) -> Optional[discord.AudioSource]:
+        if not self._cacheable:
+            return None
 
-        file = self.sound_path / str(self.ctx.guild.id) / self.name
+        pcm = self.cache.get(self.sound_id)
+        if pcm is None:
+            return None
 
+        log.debug(f'Playing sound {self.sound_id} from the audio cache.')
+        return discord.PCMAudio(io.BytesIO(pcm))
+
+    def _ffmpeg_source(self, file: Path) -> discord.AudioSource:
         source = discord.FFmpegPCMAudio(
                 str(file),
                 before_options=f'-ss {self.seek}' if self.seek else None,
                 options=f'-filter:a "atempo={self.speed}"' if self.speed else None
         )
-        source = discord.PCMVolumeTransformer(source, volume=self.volume if self.volume else 1.0)
-
-        async with self.ctx.bot.db.transaction():
-            await self.ctx.bot.db.execute(
-                    sounds.update()
-                        .values(played=sounds.c.played + 1)
-                        .where(sounds.c.id == self.sound_id)
-            )
+        if self._cacheable:
+            source = CachingSource(source, self.cache, self.sound_id)
+        return source
 
-            log.debug('Starting playback.')
-            self.vclient.play(source=source, after=self.sync_stop)
-
-    def sync_stop(self, _error):
-        coro = self.stop()
-        future = asyncio.run_coroutine_threadsafe(coro, self.ctx.bot.loop)
-        try:
-            future.result()
-        except Exception:
-            log.exception('Failed to stop playback.')
+    def _warm_source(self, file: Path) -> discord.AudioSource:
+        # blocks until ffmpeg has produced the first few frames.
+        return PrebufferedSource(self._ffmpeg_source(file))
 
-    async def stop(self, user=False):
-        log.debug('Stopping playback.')
-        try:
-            vclient = self.ctx.guild.voice_client
-        except AttributeError:
-            return
+    async def _acquire_decoder(self):
+        if self.decoders is not None:
+            await self.decoders.acquire()
+            self._holds_decoder = True
 
-        if user:
-            async with self.ctx.bot.db.transaction():
-                await self.ctx.bot.db.execute(
-                        sounds.update()
-                            .values(stopped=sounds.c.stopped + 1)
-                            .where(sounds.c.id == self.sound_id)
-                )
-                await vclient.disconnect(force=True)
-        else:
-            await vclient.disconnect(force=True)
+    def _release_decoder(self):
+        if self._holds_decoder:
+            self._holds_decoder = False
+            self.decoders.release()
 
 
 # noinspection PyIncorrectDocstring
@@ -117,13 +196,95 @@ class SoundBoard(commands.Cog):
     STOP = '\N{OCTAGONAL SIGN}'
 
     def __init__(self, bot: 'SoundBert'):
-        self.sound_path = Path(bot.config.sound_path)
+        self.storage = Storage.from_config(bot.config)
         self.bot = bot
 
-        self.playing = {}
+        # voice connection actors by guild id.
+        self.voices: Dict[int, GuildVoice] = {}
+        self.audio_cache = AudioCache(bot.config.audio_cache_size * 1024 * 1024)
+
+        config = bot.config
+        self.admission = Admission(config.guild_rate, config.guild_burst, config.user_rate, config.user_burst)
+        self.decoders = ConcurrencyLimit(config.max_decoders, config.queue_timeout, 'sounds playing')
+        self.downloads = ConcurrencyLimit(config.max_downloads, config.queue_timeout, 'downloads')
 
-        if not self.sound_path.is_dir():
-            self.sound_path.mkdir()
+        if config.audio_scheduler_threads > 0:
+            self.scheduler = AudioScheduler(bot.loop, config.audio_scheduler_threads)
+        else:
+            self.scheduler = None
+
+        if config.encoder_processes > 0:
+            self.encoders = EncoderPool(config.encoder_processes)
+        else:
+            self.encoders = None
+
+        # rendered !list pages per guild, least recently listed first.
+        self.list_cache: 'OrderedDict[int, List[str]]' = OrderedDict()
+        # counts invalidations of any guild, so that pages rendered while one happened aren't cached. a single counter
+        # rather than one per guild, so it doesn't grow with the guilds; invalidations are rare enough.
+        self.catalog_version = 0
+
+        bot.notifier.subscribe('sounds', self.invalidate, flush=self.flush)
+
+        if config.background_normalize:
+            self.normalizer = bot.loop.create_task(self._normalize_library())
+        else:
+            self.normalizer = None
+
+    def cog_unload(self):
+        self.bot.notifier.unsubscribe('sounds', self.invalidate, flush=self.flush)
+        if self.normalizer is not None:
+            self.normalizer.cancel()
+        for voice in self.voices.values():
+            voice.close()
+        if self.encoders is not None:
+            self.encoders.close()
+
+    def voice(self, guild: discord.Guild) -> GuildVoice:
+        """
+        :return: The actor that owns a guild's voice connection. Everything that touches the voice client goes
+                 through it.
+        """
+        voice = self.voices.get(guild.id)
+        if voice is None or voice.closed:
+            voice = GuildVoice(guild, self.bot.loop, self.scheduler, on_close=self._voice_closed)
+            self.voices[guild.id] = voice
+        return voice
+
+    def _voice_closed(self, voice: GuildVoice):
+        if self.voices.get(voice.guild.id) is voice:
+            del self.voices[voice.guild.id]
+
+    async def changed(self, guild_id: int, sound_ids: Iterable[int] = ()):
+        """
+        Invalidate anything cached about a guild's catalog of sounds, in every bot process. Must be called whenever
+        sounds are added, renamed or deleted, once the change has been committed.
+
+        :param guild_id: The guild whose sounds changed.
+        :param sound_ids: The sounds that changed, if any.
+        """
+        await self.bot.notifier.publish('sounds', guild_id=guild_id, sound_ids=list(sound_ids))
+
+    def invalidate(self, guild_id: int, sound_ids: List[int]):
+        self.catalog_version += 1
+        self.list_cache.pop(guild_id, None)
+        # sounds never change their audio, but this frees up the space taken by deleted ones.
+        for sound_id in sound_ids:
+            self.audio_cache.invalidate(sound_id)
+
+    def flush(self):
+        self.catalog_version += 1
+        self.list_cache.clear()
+
+    async def _normalize_library(self):
+        await self.bot.wait_until_ready()
+        normalizer = Normalizer(self.bot.db, self.storage, throttle=self.bot.config.normalize_throttle)
+        while True:
+            report = await normalizer.run()
+            if report.normalized or report.failed:
+                log.info(str(report))
+            # picks up sounds added since the last run.
+            await asyncio.sleep(NORMALIZE_PERIOD)
 
     @staticmethod
     async def get_length(file: Path):
@@ -188,7 +349,7 @@ class SoundBoard(commands.Cog):
             succeeded = []
             failed = []
             for path in Path(d).glob('**/*'):
-                if not path.is_file():
+                if not path.is_file() or path.name == MANIFEST_NAME:
                     continue
                 try:
                     await self._add(ctx, path.name, source, path, unlink=False)
@@ -203,6 +364,101 @@ class SoundBoard(commands.Cog):
 
     @commands.command()
     @commands.check(is_soundmaster)
+    async def export(self, ctx: commands.Context):
+        """
+        Export all the sounds on the soundboard as tar archives, along with a manifest of their names, aliases,
+        sources and play counts. Large soundboards are split into multiple archives.
+        """
+
+        records = await self.bot.db.fetch_all(
+                select([sounds, sound_names.c.name, sound_names.c.is_alias])
+                    .select_from(sounds.join(sound_names))
+                    .where(sound_names.c.guild_id == ctx.guild.id)
+                    .order_by(sounds.c.id, sound_names.c.is_alias, sound_names.c.name)
+        )
+
+        if not records:
+            raise exceptions.NoSounds()
+
+        entries = {}
+        for record in records:
+            sound_id = record[sounds.c.id]
+            if sound_id not in entries:
+                entries[sound_id] = {
+                    'name':        record[sound_names.c.name],
+                    'aliases':     [],
+                    'source':      record[sounds.c.source],
+                    'uploader':    record[sounds.c.uploader],
+                    'upload_time': record[sounds.c.upload_time].isoformat(),
+                    'length':      record[sounds.c.length],
+                    'played':      record[sounds.c.played],
+                    'stopped':     record[sounds.c.stopped]
+                }
+            elif record[sound_names.c.is_alias]:
+                entries[sound_id]['aliases'].append(record[sound_names.c.name])
+
+        names = [entry['name'] for entry in entries.values()]
+        paths = dict(zip(names, await asyncio.gather(*(self.storage.fetch(ctx.guild.id, name) for name in names))))
+
+        def stat_all():
+            stats = {}
+            for name, path in paths.items():
+                try:
+                    stats[name] = path.stat()
+                except FileNotFoundError:
+                    pass
+            return stats
+
+        stats = await self.bot.loop.run_in_executor(None, stat_all)
+
+        # split the sounds into parts that fit in an upload, leaving room for each part's share of the manifest.
+        limit = ctx.guild.filesize_limit - UPLOAD_OVERHEAD
+        empty_part = TarStream.archive_size([ArchiveMember.from_bytes(MANIFEST_NAME, b'{}')])
+        parts = [[]]
+        part_size = empty_part
+        too_big = []
+        for entry in entries.values():
+            stat = stats.get(entry['name'])
+            if stat is None:
+                continue
+
+            member = ArchiveMember(entry['name'], stat.st_size, path=paths[entry['name']], mtime=stat.st_mtime)
+            size = member.archived_size + len(json.dumps(entry)) + 2
+            if size + empty_part > limit:
+                too_big.append(entry['name'])
+                continue
+            if size + part_size > limit:
+                parts.append([])
+                part_size = empty_part
+
+            parts[-1].append((entry, member))
+            part_size += size
+
+        if not parts[-1]:
+            parts.pop()
+
+        for i, part in enumerate(parts, start=1):
+            manifest = {
+                'guild':  ctx.guild.id,
+                'part':   i,
+                'parts':  len(parts),
+                'sounds': [entry for entry, _ in part]
+            }
+            manifest = ArchiveMember.from_bytes(MANIFEST_NAME, json.dumps(manifest).encode())
+            stream = TarStream([manifest] + [member for _, member in part])
+
+            filename = f'sounds-{ctx.guild.id}.tar' if len(parts) == 1 else f'sounds-{ctx.guild.id}-{i}.tar'
+            await ctx.send(
+                    f'Part {i}/{len(parts)}' if len(parts) > 1 else None,
+                    file=discord.File(stream, filename=filename)
+            )
+
+        if too_big:
+            await ctx.send('Too large to export:\n' + '\n'.join(too_big))
+
+    @commands.command()
+    @commands.check(is_soundmaster)
+    @commands.check(is_admitted)
     async def add(self, ctx: commands.Context, name: NewSound(), source: str = None):
         """
         Add a new sound to the soundboard.
@@ -220,6 +476,9 @@ class SoundBoard(commands.Cog):
         await ctx.trigger_typing()
 
         def download_sound(url):
+            # youtube-dl is slow to import and only needed here, so it is imported off the event loop.
+            import youtube_dl
+
             log.debug(f'Downloading from {url}.')
             # it is impossible to pipe directly from youtube-dl's output because it does not provide an API for it
             # https://github.com/ytdl-org/youtube-dl/blob/fffc618c519d10a7335eb5b06ab13d56ecea8561/youtube_dl/utils.py#L2030-L2059
@@ -230,16 +489,17 @@ class SoundBoard(commands.Cog):
                 'logger':            log
             }
             yt = youtube_dl.YoutubeDL(options)
-            info = yt.extract_info(url)
+            try:
+                info = yt.extract_info(url)
+            except youtube_dl.DownloadError:
+                raise exceptions.DownloadError()
 
             filename = yt.prepare_filename(info)
 
             return info, Path(filename)
 
-        try:
+        async with self.downloads:
             info, file = await self.bot.loop.run_in_executor(None, download_sound, source)
-        except youtube_dl.DownloadError:
-            raise exceptions.DownloadError()
 
         length = info.get('duration')
 
@@ -254,29 +514,20 @@ class SoundBoard(commands.Cog):
         if not length:
             length = await SoundBoard.get_length(file)
 
-        server_dir = self.sound_path / str(ctx.guild.id)
-
-        if not server_dir.exists():
-            server_dir.mkdir()
-
-        if (server_dir / name).exists():
+        if await self.storage.exists(ctx.guild.id, name):
             if unlink:
-                file.unlink()
+                await self.bot.loop.run_in_executor(None, file.unlink)
             raise FileExistsError
 
-        # allows this to work on docker
-        shutil.move(str(file), str(server_dir / name))
+        await self.storage.put(ctx.guild.id, name, file)
+
+        insert = sounds.insert().values(uploader=ctx.author.id, source=source, length=length)
+        if not is_sqlite(self.bot.db):
+            # with sqlite, execute returns the new row id by itself.
+            insert = insert.returning(sounds.c.id)
 
         async with self.bot.db.transaction():
-            sound_id = await self.bot.db.fetch_val(
-                    sounds.insert()
-                        .returning(sounds.c.id)
-                        .values(
-                            uploader=ctx.author.id,
-                            source=source,
-                            length=length
-                    )
-            )
+            sound_id = await self.bot.db.execute(insert)
 
             await self.bot.db.fetch_val(
                     sound_names.insert()
@@ -287,6 +538,8 @@ class SoundBoard(commands.Cog):
                     )
             )
 
+        await self.changed(ctx.guild.id)
+
     @commands.command()
     @commands.check(is_soundmaster)
     async def alias(
@@ -321,16 +574,18 @@ class SoundBoard(commands.Cog):
                         )
                 )
 
-                link = self.sound_path / str(ctx.guild.id) / alias
-                link.symlink_to(name)
-            except asyncpg.UniqueViolationError:
+                await self.storage.link(ctx.guild.id, [(alias, name)])
+            except UniqueViolation:
                 raise exceptions.SoundExists(alias)
-            else:
-                await ok(ctx)
+
+        await self.changed(ctx.guild.id, [sound_id])
+        await ok(ctx)
 
     @commands.command(aliases=['!'])
     @commands.check(is_soundplayer)
     @commands.check(is_in_voice)
+    @commands.check(is_admitted)
+    @query_budget(2)
     async def play(
             self,
             ctx: commands.Context,
@@ -347,15 +602,24 @@ class SoundBoard(commands.Cog):
         sound_id = sound[sound_names.c.sound_id]
         name = sound[sound_names.c.name]
 
-        playback = Playback(ctx, sound_id, name, self.sound_path, *args)
-
-        self.playing[ctx.guild.id] = playback
+        playback = Playback(
+                ctx,
+                sound_id,
+                name,
+                self.storage,
+                *args,
+                cache=self.audio_cache,
+                decoders=self.decoders,
+                encoders=self.encoders
+        )
 
-        await playback.play()
+        await playback.play(self.voice(ctx.guild))
 
     @commands.command()
     @commands.check(is_soundplayer)
     @commands.check(is_in_voice)
+    @commands.check(is_admitted)
+    @query_budget(2)
     async def rand(self, ctx: commands.Context, *, args: PlaybackArgumentConverter() = _DEFAULT_PLAYBACK_ARGUMENTS):
         """
         Play a random sound.
@@ -363,21 +627,7 @@ class SoundBoard(commands.Cog):
         :param args: The volume/speed of playback, in format v[XX%] s[SS%]. e.g. v50 s100 for 50% sound, 100% speed.
         """
 
-        sound = await self.bot.db.fetch_one(
-                select([sound_names.c.sound_id, sound_names.c.name])
-                    .where(
-                        and_(
-                                sound_names.c.guild_id == ctx.guild.id,
-                                ~sound_names.c.is_alias
-                        ))
-                    .offset(
-                        func.floor(
-                                func.random() *
-                                select([func.count()])
-                                .select_from(sound_names)
-                                .where(sound_names.c.guild_id == ctx.guild.id)))
-                    .limit(1)
-        )
+        sound = await SoundBoard._random(self.bot.db, ctx.guild.id)
         log.debug(f'Playing random sound {sound[sound_names.c.name]}.')
         await ctx.invoke(self.play, sound, args=args)
 
@@ -388,36 +638,201 @@ class SoundBoard(commands.Cog):
         Stop playback of the current sound.
         """
 
+        voice = self.voices.get(ctx.guild.id)
+        if voice is None:
+            return
+
+        playback = await voice.stop()
+        if isinstance(playback, Playback):
+            await self.bot.db.execute(
+                    sounds.update()
+                        .values(stopped=sounds.c.stopped + 1)
+                        .where(sounds.c.id == playback.sound_id)
+            )
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def broadcast(
+            self,
+            ctx: commands.Context,
+            sound: ExistingSound([sound_names.c.sound_id, sound_names.c.name]),
+            *channel_ids: int
+    ):
+        """
+        Play a sound in many voice channels at once. The sound is only decoded and encoded once, however many channels
+        it is played in.
+
+        :param sound: The name of the sound to play.
+        :param channel_ids: IDs of the voice channels to play it in. Channels in guilds that are already playing
+                            something are skipped.
+        """
+        sound_id = sound[sound_names.c.sound_id]
+        name = sound[sound_names.c.name]
+
+        channels = []
+        guilds = set()
+        for channel_id in channel_ids:
+            channel = self.bot.get_channel(channel_id)
+            if not isinstance(channel, VoiceChannel) or channel.guild.id in guilds:
+                continue
+            voice = self.voices.get(channel.guild.id)
+            if voice is not None and voice.is_playing():
+                continue
+            guilds.add(channel.guild.id)
+            channels.append(channel)
+
+        if not channels:
+            raise exceptions.NoBroadcastTargets()
+
+        log.debug(f'Broadcasting sound {name} ({sound_id}) to {len(channels)} voice channels.')
+
+        # the whole broadcast only takes up one decoder.
+        await self.decoders.acquire()
+
+        voices = [self.voice(channel.guild) for channel in channels]
+        connecting = asyncio.gather(
+                *(voice.join(channel) for voice, channel in zip(voices, channels)),
+                return_exceptions=True
+        )
         try:
-            playback = self.playing.pop(ctx.guild.id)
-            await playback.stop(user=True)
-        except KeyError:
-            # nothing was playing
-            pass
+            pcm = self.audio_cache.get(sound_id) if self.audio_cache.enabled else None
+            if pcm is not None:
+                source = discord.PCMAudio(io.BytesIO(pcm))
+            else:
+                file = await self.storage.fetch(ctx.guild.id, name)
+                source = await self.bot.loop.run_in_executor(
+                        None,
+                        lambda: PrebufferedSource(discord.FFmpegPCMAudio(str(file)))
+                )
+        except BaseException:
+            self.decoders.release()
+            await connecting
+            await asyncio.gather(*(voice.leave_if_idle() for voice in voices))
+            raise
+
+        targets = []
+        for voice, channel, joined in zip(voices, channels, await connecting):
+            if isinstance(joined, BaseException):
+                log.warning(f'Could not connect to #{channel.name} ({channel.id}) to broadcast.', exc_info=joined)
+            else:
+                targets.append((voice, channel))
+
+        # every listener gets the same packets, so they are encoded for the lowest bitrate among the channels.
+        settings = EncoderSettings.for_channels(
+                (channel for _, channel in targets),
+                self.bot.config.opus_max_bitrate,
+                self.bot.config.opus_packet_loss
+        )
+        # the decoder is released once every listener is done, which may be on an audio thread.
+        broadcast = Broadcast(
+                source,
+                on_close=partial(self.bot.loop.call_soon_threadsafe, self.decoders.release),
+                settings=settings
+        )
+        if not targets:
+            broadcast.close()
+            raise exceptions.NoBroadcastTargets()
+
+        # every listener must be registered before any of them starts, or the first to finish would end the broadcast.
+        listeners = [broadcast.listen() for _ in targets]
+        results = await asyncio.gather(
+                *(voice.start(None, listener, channel, replace=False)
+                  for (voice, channel), listener in zip(targets, listeners)),
+                return_exceptions=True
+        )
+
+        started = 0
+        for (voice, channel), listener, result in zip(targets, listeners, results):
+            if isinstance(result, BaseException):
+                # most likely something started playing while connecting.
+                log.debug(f'Could not broadcast to #{channel.name} ({channel.id}): {result}')
+                listener.cleanup()
+            else:
+                started += 1
 
-    @commands.command(aliases=['ls'])
+        await ctx.send(
+                f'Broadcasting `{name}` to {started} {pluralize(started, "channel")} '
+                f'({len(channel_ids) - started} skipped).'
+        )
+
+    @commands.group(aliases=['ls'], invoke_without_command=True)
     @commands.check(is_soundplayer)
     async def list(self, ctx: commands.Context):
         """
         List all the sounds on the soundboard.
+
+        Use !list file to get the full list as a text file instead.
         """
 
-        all_sounds = await self.bot.db.fetch_all(
-                select([sound_names.c.name])
-                    .where(and_(
-                        sound_names.c.guild_id == ctx.guild.id,
-                        ~sound_names.c.is_alias
-                ))
-                    .order_by(sound_names.c.name)
-        )
+        pages = self.list_cache.get(ctx.guild.id)
+        if pages is not None:
+            self.list_cache.move_to_end(ctx.guild.id)
+            paginator = DictionaryPaginator(ctx, items=None, header='**Sounds**', pages=pages)
+        else:
+            version = self.catalog_version
+            all_sounds = [name async for name in self._iter_names(ctx.guild.id)]
 
-        if len(all_sounds) == 0:
-            raise exceptions.NoSounds()
+            if len(all_sounds) == 0:
+                raise exceptions.NoSounds()
+
+            paginator = DictionaryPaginator(ctx, items=all_sounds, header='**Sounds**')
+            # the names may predate an invalidation that came in while they were being fetched.
+            if version == self.catalog_version:
+                self.list_cache[ctx.guild.id] = paginator.pages
+                self.list_cache.move_to_end(ctx.guild.id)
+                while len(self.list_cache) > LIST_CACHE_GUILDS:
+                    self.list_cache.popitem(last=False)
 
-        all_sounds = [sound[sound_names.c.name] for sound in all_sounds]
-        paginator = DictionaryPaginator(ctx, items=all_sounds, header='**Sounds**')
         await paginator.paginate()
 
+    @list.command(name='file')
+    async def list_file(self, ctx: commands.Context):
+        """
+        Get a list of all the sounds on the soundboard as a text file.
+        """
+
+        listing = io.StringIO()
+        async for name in self._iter_names(ctx.guild.id):
+            listing.write(f'{name}\n')
+
+        if listing.tell() == 0:
+            raise exceptions.NoSounds()
+
+        listing = io.BytesIO(listing.getvalue().encode())
+        await ctx.send(file=discord.File(listing, filename='sounds.txt'))
+
+    async def _iter_names(self, guild_id: int, batch_size=1000) -> AsyncIterator[str]:
+        """
+        Iterate over the names of all sounds (not aliases) in a guild, in order. Names are fetched in batches using
+        keyset pagination, so large guilds are never loaded in one query.
+
+        :param guild_id: The guild ID.
+        :param batch_size: How many names to fetch per query.
+        """
+
+        last = None
+        while True:
+            whereclause = and_(
+                    sound_names.c.guild_id == guild_id,
+                    ~sound_names.c.is_alias
+            )
+            if last is not None:
+                whereclause.append(sound_names.c.name > last)
+
+            records = await self.bot.db.fetch_all(
+                    select([sound_names.c.name])
+                        .where(whereclause)
+                        .order_by(sound_names.c.name)
+                        .limit(batch_size)
+            )
+
+            for record in records:
+                yield record[sound_names.c.name]
+
+            if len(records) < batch_size:
+                break
+            last = records[-1][sound_names.c.name]
+
     @commands.command(aliases=['stat'])
     @commands.check(is_soundplayer)
     async def info(
@@ -489,6 +904,38 @@ class SoundBoard(commands.Cog):
             response = header + '\n'.join(results)
             await ctx.send(response)
 
+    @staticmethod
+    async def _random(db, guild_id):
+        """
+        Pick a random sound, not counting aliases.
+
+        :param guild_id: The guild ID.
+        :return: The sound's id and name.
+        """
+
+        query = select([sound_names.c.sound_id, sound_names.c.name]) \
+            .where(
+                and_(
+                        sound_names.c.guild_id == guild_id,
+                        ~sound_names.c.is_alias
+                ))
+        if is_sqlite(db):
+            # sqlite's random() is an integer, so it can't pick an offset. its guilds are small enough to shuffle.
+            query = query.order_by(func.random())
+        else:
+            query = query.offset(
+                    func.floor(
+                            func.random() *
+                            select([func.count()])
+                            .select_from(sound_names)
+                            .where(
+                                    and_(
+                                            sound_names.c.guild_id == guild_id,
+                                            ~sound_names.c.is_alias
+                                    ))))
+
+        return await db.fetch_one(query.limit(1))
+
     @staticmethod
     async def _search(db, guild_id, query, alias=None, limit=10):
         """
@@ -501,9 +948,17 @@ class SoundBoard(commands.Cog):
         :return:
         """
 
+        if is_sqlite(db):
+            # no trigram matching, so settle for names containing the query, closest in length first.
+            match = sound_names.c.name.contains(query, autoescape=True)
+            order = func.length(sound_names.c.name)
+        else:
+            # The first % escapes the second % here.
+            match = sound_names.c.name.op('%%')(query)
+            order = func.similarity(sound_names.c.name, query).desc()
+
         whereclause = and_(
-                # The first % escapes the second % here.
-                sound_names.c.name.op('%%')(query),
+                match,
                 sound_names.c.guild_id == guild_id
         )
 
@@ -512,16 +967,13 @@ class SoundBoard(commands.Cog):
                     sound_names.c.is_alias == alias
             )
 
-        similarity = func.similarity(sound_names.c.name, query).label('similarity')
-
         return await db.fetch_all(
                 select([
                     sound_names.c.name,
                     sound_names.c.is_alias,
-                    # similarity
                 ])
                     .where(whereclause)
-                    .order_by(similarity.desc())
+                    .order_by(order)
                     .limit(limit)
         )
 
@@ -530,7 +982,12 @@ class SoundBoard(commands.Cog):
     async def rename(
             self,
             ctx: commands.Context,
-            sound: ExistingSound([sound_names.c.name, sound_names.c.id]),
+            sound: ExistingSound([
+                sound_names.c.name,
+                sound_names.c.id,
+                sound_names.c.sound_id,
+                sound_names.c.is_alias
+            ]),
             new_name: NewSound()
     ):
         """
@@ -542,25 +999,40 @@ class SoundBoard(commands.Cog):
 
         name = sound[sound_names.c.name]
         name_id = sound[sound_names.c.id]
+        sound_id = sound[sound_names.c.sound_id]
+        is_alias = sound[sound_names.c.is_alias]
 
         async with self.bot.db.transaction():
             try:
-                updated = await self.bot.db.fetch_val(
-                        sound_names.update()
-                            .values(name=new_name)
-                            .where(sound_names.c.id == name_id)
-                            .returning(true())
-                )
-                if updated is None:
-                    raise exceptions.SoundDoesNotExist(name)
-
-                file = self.sound_path / str(ctx.guild.id) / name
-                renamed = file.with_name(new_name)
-                shutil.move(str(file), str(renamed))
-            except asyncpg.UniqueViolationError:
+                update = sound_names.update().values(name=new_name).where(sound_names.c.id == name_id)
+                if is_sqlite(self.bot.db):
+                    # no returning, but also no other process that could have deleted it in the meantime.
+                    await self.bot.db.execute(update)
+                else:
+                    updated = await self.bot.db.fetch_val(update.returning(true()))
+                    if updated is None:
+                        raise exceptions.SoundDoesNotExist(name)
+
+                await self.storage.move(ctx.guild.id, [(name, new_name)])
+
+                if not is_alias:
+                    aliases = await self.bot.db.fetch_all(
+                            select([sound_names.c.name])
+                                .where(and_(
+                                    sound_names.c.sound_id == sound_id,
+                                    sound_names.c.is_alias
+                            ))
+                    )
+                    if aliases:
+                        await self.storage.link(
+                                ctx.guild.id,
+                                [(alias[sound_names.c.name], new_name) for alias in aliases]
+                        )
+            except UniqueViolation:
                 raise exceptions.SoundExists(new_name)
-            else:
-                await ok(ctx)
+
+        await self.changed(ctx.guild.id, [sound_id])
+        await ok(ctx)
 
     @commands.command(aliases=['del', 'rm'])
     @commands.check(is_soundmaster)
@@ -585,11 +1057,270 @@ class SoundBoard(commands.Cog):
             if is_alias:
                 # if alias, just delete the alias.
                 await self.bot.db.execute(sound_names.delete().where(sound_names.c.id == name_id))
+                names = [name]
             else:
-                # if not alias, delete the sound and CASCADE will take care of the names and aliases.
+                # if not alias, delete the sound along with its names and aliases. this doesn't rely on CASCADE, since
+                # sqlite doesn't enforce foreign keys by default.
+                names = await self.bot.db.fetch_all(
+                        select([sound_names.c.name]).where(sound_names.c.sound_id == sound_id)
+                )
+                names = [record[sound_names.c.name] for record in names]
+                await self.bot.db.execute(sound_names.delete().where(sound_names.c.sound_id == sound_id))
                 await self.bot.db.execute(sounds.delete().where(sounds.c.id == sound_id))
 
-            # aliases are symbolic links, so this will still work
-            file = self.sound_path / str(ctx.guild.id) / name
-            file.unlink()
-            await ok(ctx)
+            await self.storage.delete(ctx.guild.id, names)
+
+        await self.changed(ctx.guild.id, [sound_id])
+        await ok(ctx)
+
+    @commands.group(invoke_without_command=True)
+    @commands.check(is_soundmaster)
+    async def bulk(self, ctx: commands.Context):
+        """
+        Manage many sounds at once.
+
+        Patterns are case-insensitive shell-style globs that match whole names, e.g. air*, or regular expressions
+        that match anywhere in a name when prefixed with re:, e.g. re:^air(horn)?$. Each command looks up all of its
+        sounds at once and applies every change together.
+        """
+        await ctx.send_help(ctx.command)
+
+    @bulk.command(name='delete', aliases=['del', 'rm'])
+    @commands.check(is_soundmaster)
+    async def bulk_delete(self, ctx: commands.Context, *patterns: str):
+        """
+        Delete every sound or alias matching any of the patterns. Deleting a sound also deletes its aliases. What
+        would be deleted is listed first, and nothing is deleted until it is confirmed.
+
+        :param patterns: The patterns to match.
+        """
+
+        records, matched = await self._match(ctx.guild.id, patterns)
+
+        sound_ids = {record[sound_names.c.sound_id] for record in matched if not record[sound_names.c.is_alias]}
+        alias_ids = [
+            record[sound_names.c.id]
+            for record in matched
+            if record[sound_names.c.is_alias] and record[sound_names.c.sound_id] not in sound_ids
+        ]
+        deleted = [
+            record[sound_names.c.name]
+            for record in records
+            if record[sound_names.c.sound_id] in sound_ids or record[sound_names.c.id] in alias_ids
+        ]
+
+        if not await self._confirm(ctx, deleted):
+            return
+
+        async with self.bot.db.transaction():
+            await self.bot.db.execute(
+                    sound_names.delete().where(or_(
+                            sound_names.c.sound_id.in_(sound_ids),
+                            sound_names.c.id.in_(alias_ids)
+                    ))
+            )
+            await self.bot.db.execute(sounds.delete().where(sounds.c.id.in_(sound_ids)))
+
+            await self.storage.delete(ctx.guild.id, deleted)
+
+        await self.changed(ctx.guild.id, sound_ids)
+
+        alias_count = len(deleted) - len(sound_ids)
+        await ctx.send(f'Deleted {len(sound_ids)} {pluralize(len(sound_ids), "sound")} '
+                       f'and {alias_count} {"alias" if alias_count == 1 else "aliases"}.')
+        await ok(ctx)
+
+    @bulk.command(name='rename', aliases=['mv'])
+    @commands.check(is_soundmaster)
+    async def bulk_rename(self, ctx: commands.Context, pattern: str, replacement: str):
+        """
+        Rename every sound or alias matching a pattern. New names are made by substituting the replacement for the
+        match, so regular expression groups can be used, e.g. re:^(.*)_old$ \\1. A glob matches the whole name, so
+        \\g<0> in the replacement stands for the old name, e.g. air* \\g<0>_old.
+
+        :param pattern: The pattern to match.
+        :param replacement: The replacement.
+        """
+
+        records, matched = await self._match(ctx.guild.id, [pattern])
+        renames = self._substitute(records, matched, pattern, replacement)
+
+        new_names = {record[sound_names.c.name]: new_name for record, new_name in renames}
+        primary_names = {
+            record[sound_names.c.sound_id]: record[sound_names.c.name]
+            for record in records
+            if not record[sound_names.c.is_alias]
+        }
+        renamed_sounds = {
+            record[sound_names.c.sound_id]
+            for record, _ in renames
+            if not record[sound_names.c.is_alias]
+        }
+        # aliases are links to their sound's name, so they need to be pointed at the new name.
+        relinks = [
+            (
+                new_names.get(record[sound_names.c.name], record[sound_names.c.name]),
+                new_names[primary_names[record[sound_names.c.sound_id]]]
+            )
+            for record in records
+            if record[sound_names.c.is_alias] and record[sound_names.c.sound_id] in renamed_sounds
+        ]
+
+        async with self.bot.db.transaction():
+            await self.bot.db.execute(
+                    sound_names.update()
+                        .where(sound_names.c.id.in_([record[sound_names.c.id] for record, _ in renames]))
+                        .values(name=case(
+                            {record[sound_names.c.id]: new_name for record, new_name in renames},
+                            value=sound_names.c.id
+                    ))
+            )
+
+            await self.storage.move(ctx.guild.id, list(new_names.items()))
+            await self.storage.link(ctx.guild.id, relinks)
+
+        await self.changed(ctx.guild.id, {record[sound_names.c.sound_id] for record, _ in renames})
+
+        await ctx.send(f'Renamed {len(renames)} {pluralize(len(renames), "sound")}.')
+        await ok(ctx)
+
+    @bulk.command(name='alias')
+    @commands.check(is_soundmaster)
+    async def bulk_alias(self, ctx: commands.Context, pattern: str, replacement: str):
+        """
+        Alias every sound matching a pattern. Aliases are named by substituting the replacement for the match, so
+        regular expression groups can be used, e.g. re:^airhorn_(.*)$ ah_\\1. \\g<0> is the whole name.
+
+        :param pattern: The pattern to match.
+        :param replacement: The replacement.
+        """
+
+        records, matched = await self._match(ctx.guild.id, [pattern])
+        matched = [record for record in matched if not record[sound_names.c.is_alias]]
+        if not matched:
+            raise exceptions.AliasTargetIsAlias()
+
+        aliases = self._substitute(records, matched, pattern, replacement)
+
+        async with self.bot.db.transaction():
+            await self.bot.db.execute(
+                    sound_names.insert()
+                        .values([
+                        {
+                            'sound_id': record[sound_names.c.sound_id],
+                            'guild_id': ctx.guild.id,
+                            'name':     alias,
+                            'is_alias': True
+                        }
+                        for record, alias in aliases
+                    ])
+            )
+
+            await self.storage.link(
+                    ctx.guild.id,
+                    [(alias, record[sound_names.c.name]) for record, alias in aliases]
+            )
+
+        await self.changed(ctx.guild.id, {record[sound_names.c.sound_id] for record, _ in aliases})
+
+        await ctx.send(f'Created {len(aliases)} {"alias" if len(aliases) == 1 else "aliases"}.')
+        await ok(ctx)
+
+    async def _confirm(self, ctx: commands.Context, names: List[str]) -> bool:
+        """
+        List the names that are about to be deleted, and wait for whoever asked to react to confirm.
+
+        :return: Whether it was confirmed before the timeout.
+        """
+
+        listed = ', '.join(f'`{name}`' for name in names[:CONFIRM_LIST_LIMIT])
+        if len(names) > CONFIRM_LIST_LIMIT:
+            listed += f' and {len(names) - CONFIRM_LIST_LIMIT} more'
+        msg = await ctx.send(
+                f'This will delete {len(names)} {pluralize(len(names), "name")}: {listed}.\n'
+                f'React with \N{WHITE HEAVY CHECK MARK} within {CONFIRM_TIMEOUT} seconds to confirm.'
+        )
+        await msg.add_reaction('\N{WHITE HEAVY CHECK MARK}')
+
+        def check(payload: discord.RawReactionActionEvent):
+            return (
+                    payload.message_id == msg.id
+                    and payload.user_id == ctx.author.id
+                    and str(payload.emoji) == '\N{WHITE HEAVY CHECK MARK}'
+            )
+
+        try:
+            await self.bot.wait_for('raw_reaction_add', check=check, timeout=CONFIRM_TIMEOUT)
+        except asyncio.TimeoutError:
+            await msg.edit(content=f'{msg.content.splitlines()[0]}\nCancelled, nothing was deleted.')
+            return False
+        return True
+
+    async def _match(self, guild_id: int, patterns) -> Tuple[List, List]:
+        """
+        Find every name in a guild that matches any of the patterns.
+
+        :param guild_id: The guild ID.
+        :param patterns: Globs, or regular expressions prefixed with re:.
+        :return: All the names in the guild, and the ones that matched.
+        """
+
+        matchers = [self._compile(pattern) for pattern in patterns]
+
+        records = await self.bot.db.fetch_all(
+                select([sound_names.c.id, sound_names.c.sound_id, sound_names.c.name, sound_names.c.is_alias])
+                    .where(sound_names.c.guild_id == guild_id)
+        )
+
+        matched = [
+            record
+            for record in records
+            if any(match(record[sound_names.c.name]) for match in matchers)
+        ]
+        if not matched:
+            raise exceptions.NoMatches(patterns)
+
+        return records, matched
+
+    @staticmethod
+    def _compile(pattern: str) -> Callable[[str], Optional[Match]]:
+        """
+        :return: A function that matches a name against the pattern. Globs have to match the whole name, like they do
+            in a shell, while regular expressions match anywhere in it unless they are anchored.
+        """
+        if pattern.startswith('re:'):
+            try:
+                return re.compile(pattern[3:], re.IGNORECASE).search
+            except re.error:
+                raise exceptions.BadPattern(pattern[3:])
+        return re.compile(fnmatch.translate(pattern), re.IGNORECASE).fullmatch
+
+    @staticmethod
+    def _substitute(records, matched, pattern: str, replacement: str):
+        """
+        Make new names for matched records, and make sure they are valid and don't collide with each other or any
+        existing names.
+
+        :return: Pairs of matched records and their new names.
+        """
+
+        match = SoundBoard._compile(pattern)
+
+        taken = {record[sound_names.c.name].casefold() for record in records}
+        results = []
+        for record in matched:
+            name = record[sound_names.c.name]
+            m = match(name)
+            try:
+                # only the matched part is replaced, which for a glob is the whole name.
+                new_name = name[:m.start()] + m.expand(replacement) + name[m.end():]
+            except re.error:
+                raise exceptions.BadPattern(replacement)
+            new_name = validate_name(new_name)
+
+            if new_name.casefold() in taken:
+                raise exceptions.SoundExists(new_name)
+            taken.add(new_name.casefold())
+            results.append((record, new_name))
+
+        return results
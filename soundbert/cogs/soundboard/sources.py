@@ -0,0 +1,42 @@
+import collections
+import logging
+
+import discord
+
+log = logging.getLogger(__name__)
+
+# 100 ms of audio.
+PREBUFFER_FRAMES = 5
+
+
+class PrebufferedSource(discord.AudioSource):
+    """
+    Reads the first few frames of another source up front, so that its decoder is already producing audio by the time
+    playback starts. Constructing one blocks until those frames have been read.
+    """
+
+    def __init__(self, source: discord.AudioSource, frames=PREBUFFER_FRAMES):
+        self.source = source
+        self.buffer = collections.deque()
+
+        try:
+            for _ in range(frames):
+                frame = source.read()
+                self.buffer.append(frame)
+                if not frame:
+                    break
+        except BaseException:
+            source.cleanup()
+            raise
+
+    def read(self):
+        if self.buffer:
+            return self.buffer.popleft()
+        return self.source.read()
+
+    def is_opus(self):
+        return self.source.is_opus()
+
+    def cleanup(self):
+        self.buffer.clear()
+        self.source.cleanup()
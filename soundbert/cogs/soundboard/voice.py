@@ -0,0 +1,300 @@
+import asyncio
+import logging
+import threading
+from functools import partial
+from typing import Callable, Optional
+
+import discord
+from discord import Guild, VoiceChannel, VoiceClient
+
+from .encoding import EncoderSettings
+from .scheduler import AudioScheduler
+
+log = logging.getLogger(__name__)
+
+# seconds an actor with nothing to do and no connection waits for more work before exiting.
+IDLE_TIMEOUT = 60
+# seconds to wait before cleaning up a replaced source, in case the audio thread is still reading from it.
+REPLACE_GRACE = 0.1
+
+
+class _SwappableSource(discord.AudioSource):
+    """
+    What discord.py's audio player plays when there is no scheduler. Sounds are swapped inside it, so the player never
+    sees a replacement, and only ends once the sound playing at the time runs out.
+    """
+
+    def __init__(self, source: discord.AudioSource):
+        self.source = source
+        self.ended = False
+        self._lock = threading.Lock()
+
+    def swap(self, source: discord.AudioSource) -> Optional[discord.AudioSource]:
+        """
+        :return: The replaced source, or None if the player already read the end of it and is stopping.
+        """
+        with self._lock:
+            if self.ended:
+                return None
+            old, self.source = self.source, source
+            return old
+
+    def read(self):
+        while True:
+            source = self.source
+            data = source.read()
+            if data:
+                return data
+            with self._lock:
+                # the end of a source that was swapped out meanwhile is not the end of playback.
+                if self.source is source:
+                    self.ended = True
+                    return b''
+
+    def is_opus(self):
+        return self.source.is_opus()
+
+    def cleanup(self):
+        self.source.cleanup()
+
+
+class GuildVoice:
+    """
+    Owns a guild's voice connection. Joining, playing and stopping are queued and carried out in order by a single
+    task, so commands arriving at the same time can't race each other over the voice client.
+
+    Whatever is playing belongs to an owner, whose finished() method is called on the event loop once its audio is
+    done, stopped or replaced.
+    """
+
+    def __init__(
+            self,
+            guild: Guild,
+            loop: asyncio.AbstractEventLoop,
+            scheduler: AudioScheduler = None,
+            on_close: Callable[['GuildVoice'], None] = None
+    ):
+        """
+        :param guild: The guild.
+        :param loop: The event loop.
+        :param scheduler: The shared audio scheduler, if it is enabled.
+        :param on_close: Called when the actor exits after being idle for a while.
+        """
+        self.guild = guild
+        self.loop = loop
+        self.scheduler = scheduler
+        self.on_close = on_close
+        self.owner = None
+        self.closed = False
+        # the encoder last set up on the voice client, and how.
+        self._encoder: Optional[discord.opus.Encoder] = None
+        self._encoder_settings: Optional[EncoderSettings] = None
+        # what the voice client's own player plays, when there is no scheduler.
+        self._source: Optional[_SwappableSource] = None
+
+        # counts the audio started, so that a late callback from audio that was stopped can be told apart.
+        self._stream = 0
+        self._queue = asyncio.Queue()
+        self._task = loop.create_task(self._run())
+
+    @property
+    def vclient(self) -> Optional[VoiceClient]:
+        return self.guild.voice_client
+
+    def is_playing(self) -> bool:
+        vclient = self.vclient
+        if vclient is None:
+            return False
+        if self.scheduler is not None:
+            return self.scheduler.is_playing(vclient)
+        return vclient.is_playing()
+
+    async def join(self, channel: VoiceChannel) -> VoiceClient:
+        """
+        Connect to a voice channel, or move to it if already connected to another one.
+        """
+        return await self._submit(self._join, channel)
+
+    async def start(
+            self,
+            owner,
+            source: discord.AudioSource,
+            channel: VoiceChannel,
+            replace=True,
+            settings: EncoderSettings = None
+    ):
+        """
+        Start playing a source. Anything already playing is replaced from the next frame on, without reconnecting.
+
+        :param owner: What the audio belongs to.
+        :param source: The source. Cleaned up by whoever plays it once it is started.
+        :param channel: The voice channel to play in.
+        :param replace: Whether to replace what is already playing, rather than raise ClientException.
+        :param settings: How the voice client encodes PCM sources. Defaults to discord.py's settings.
+        """
+        await self._submit(self._start, owner, source, channel, replace, settings)
+
+    async def stop(self):
+        """
+        Stop playing and disconnect.
+
+        :return: The owner of what was playing, if anything.
+        """
+        return await self._submit(self._stop)
+
+    async def leave_if_idle(self):
+        """
+        Disconnect, unless something is playing.
+        """
+        await self._submit(self._leave_if_idle)
+
+    def close(self):
+        self.closed = True
+        self._task.cancel()
+
+    async def _submit(self, func, *args):
+        future = self.loop.create_future()
+        self._queue.put_nowait((func, args, future))
+        return await future
+
+    def _enqueue(self, func, *args):
+        self._queue.put_nowait((func, args, self.loop.create_future()))
+
+    async def _run(self):
+        while True:
+            try:
+                func, args, future = await asyncio.wait_for(self._queue.get(), IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                if self._queue.empty() and self.vclient is None:
+                    self.closed = True
+                    if self.on_close is not None:
+                        self.on_close(self)
+                    return
+                continue
+
+            if future.cancelled():
+                continue
+            try:
+                result = await func(*args)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                elif not isinstance(e, discord.ClientException):
+                    log.exception(f'Voice operation {func.__name__} failed in guild {self.guild.id}.')
+            else:
+                if not future.done():
+                    future.set_result(result)
+
+    async def _join(self, channel: VoiceChannel) -> VoiceClient:
+        vclient = self.vclient
+        if vclient is None:
+            log.debug(f'Connecting to voice channel {channel.id}.')
+            return await channel.connect()
+        if vclient.channel != channel:
+            log.debug(f'Moving to voice channel {channel.id}.')
+            await vclient.move_to(channel)
+        return vclient
+
+    async def _start(
+            self,
+            owner,
+            source: discord.AudioSource,
+            channel: VoiceChannel,
+            replace: bool,
+            settings: Optional[EncoderSettings]
+    ):
+        # whatever was played last may have finished and disconnected since its caller joined.
+        vclient = await self._join(channel)
+        self._set_up_encoder(vclient, source, settings)
+
+        old = None
+        if self.is_playing():
+            if not replace:
+                raise discord.ClientException('Already playing audio.')
+
+            if self.scheduler is not None:
+                old = self.scheduler.replace(vclient, source)
+            elif self._source is not None:
+                old = self._source.swap(source)
+
+        if old is not None:
+            log.debug(f'Replacing the playing sound in guild {self.guild.id}.')
+            # the old source may still be in the middle of a read for up to a frame, and cleaning it up can block.
+            self.loop.call_later(REPLACE_GRACE, self.loop.run_in_executor, None, old.cleanup)
+        else:
+            log.debug(f'Starting playback in guild {self.guild.id}.')
+            self._stream += 1
+            after = partial(self._audio_finished, self._stream)
+            if self.scheduler is not None:
+                self.scheduler.play(vclient, source, after=after)
+            else:
+                # the player may have just read the end of the last sound, and not have stopped yet.
+                vclient.stop()
+                self._source = _SwappableSource(source)
+                vclient.play(self._source, after=after)
+
+        self._finish_owner()
+        self.owner = owner
+
+    def _set_up_encoder(
+            self,
+            vclient: VoiceClient,
+            source: discord.AudioSource,
+            settings: Optional[EncoderSettings]
+    ):
+        # opus sources were already encoded, with their settings, and are sent as they are.
+        if source.is_opus():
+            return
+        if settings is None:
+            # a swapped in pcm source still needs the encoder that vclient.play only creates for pcm sources.
+            if vclient.encoder is None:
+                vclient.encoder = discord.opus.Encoder()
+            return
+
+        if vclient.encoder is not None and vclient.encoder is self._encoder and settings == self._encoder_settings:
+            return
+        # the audio thread may be encoding with the current encoder, which can't safely be reconfigured meanwhile.
+        vclient.encoder = settings.encoder()
+        self._encoder, self._encoder_settings = vclient.encoder, settings
+        log.debug(f'Encoding at {settings.bitrate} kbps in guild {self.guild.id}.')
+
+    async def _stop(self):
+        owner = self.owner
+        # the callback of the audio being stopped must not finish whatever plays next.
+        self._stream += 1
+
+        vclient = self.vclient
+        if vclient is not None:
+            if self.scheduler is not None:
+                self.scheduler.stop(vclient)
+            await vclient.disconnect(force=True)
+        self._source = None
+
+        self._finish_owner()
+        return owner
+
+    async def _leave_if_idle(self):
+        vclient = self.vclient
+        if vclient is not None and not self.is_playing():
+            await vclient.disconnect(force=True)
+
+    async def _finished(self, stream: int):
+        if stream != self._stream:
+            return
+
+        self._finish_owner()
+        await self._leave_if_idle()
+
+    def _audio_finished(self, stream: int, error: Optional[Exception]):
+        # called from an audio thread, which must not be kept waiting.
+        if error is not None:
+            log.error(f'Error while playing audio in guild {self.guild.id}.', exc_info=error)
+        self.loop.call_soon_threadsafe(self._enqueue, self._finished, stream)
+
+    def _finish_owner(self):
+        owner, self.owner = self.owner, None
+        if owner is not None:
+            try:
+                owner.finished()
+            except Exception:
+                log.exception('Failed to finish playback.')
@@ -0,0 +1,139 @@
+import io
+import tarfile
+import time
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+CHUNK_SIZE = 1 << 16  # 64 KB
+
+
+class ArchiveMember:
+    def __init__(self, name: str, size: int, *, path: Path = None, data: bytes = None, mtime: float = None):
+        """
+        A file to put in an archive. Exactly one of path and data should be given.
+
+        :param name: Name of the file in the archive.
+        :param size: Size of the file. Files on disk are truncated or zero-padded to this size if they change.
+        :param path: Path of the file on disk.
+        :param data: Contents of the file.
+        :param mtime: Modification time. Defaults to now.
+        """
+        self.name = name
+        self.size = size
+        self.path = path
+        self.data = data
+
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = time.time() if mtime is None else mtime
+        self.header = info.tobuf(format=tarfile.PAX_FORMAT)
+
+    @classmethod
+    def from_bytes(cls, name: str, data: bytes) -> 'ArchiveMember':
+        return cls(name, len(data), data=data)
+
+    @property
+    def archived_size(self) -> int:
+        """
+        How many bytes this member takes up in an archive.
+        """
+        return len(self.header) + _padded(self.size)
+
+
+class TarStream(io.RawIOBase):
+    """
+    A read-only file object that generates an uncompressed tar archive on the fly, reading member files from disk as
+    it goes, so the archive is never staged on disk or held in memory.
+
+    Its size is known up front, and seeking back to the start regenerates it from scratch, so uploads can be retried.
+    """
+
+    def __init__(self, members: List[ArchiveMember]):
+        super(TarStream, self).__init__()
+        self.members = members
+        self.size = self.archive_size(members)
+
+        self._chunks: Optional[Iterator[bytes]] = None
+        self._buffer = memoryview(b'')
+        self._position = 0
+        self.seek(0)
+
+    @staticmethod
+    def archive_size(members: List[ArchiveMember]) -> int:
+        # two empty blocks mark the end of the archive, and the whole thing is padded to a full record.
+        size = sum(member.archived_size for member in members) + 2 * tarfile.BLOCKSIZE
+        return _padded(size, tarfile.RECORDSIZE)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        # only to the start, which is all discord.File needs to retry an upload, but it refuses streams that say no.
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if offset == 0 and whence == io.SEEK_CUR:
+            return self._position
+        if offset != 0 or whence != io.SEEK_SET:
+            raise io.UnsupportedOperation('TarStream can only seek to the start.')
+
+        self._chunks = self._generate()
+        self._buffer = memoryview(b'')
+        self._position = 0
+        return 0
+
+    def readinto(self, b):
+        while not self._buffer:
+            try:
+                self._buffer = memoryview(next(self._chunks))
+            except StopIteration:
+                return 0
+
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        self._position += n
+        return n
+
+    def _generate(self) -> Iterator[bytes]:
+        written = 0
+        for member in self.members:
+            yield member.header
+
+            if member.data is not None:
+                yield member.data
+            else:
+                yield from _read_exactly(member.path, member.size)
+
+            padding = _padded(member.size) - member.size
+            if padding:
+                yield bytes(padding)
+
+            written += member.archived_size
+
+        yield bytes(self.size - written)
+
+
+def _padded(size: int, block=tarfile.BLOCKSIZE) -> int:
+    return -(-size // block) * block
+
+
+def _read_exactly(path: Path, size: int) -> Iterator[bytes]:
+    remaining = size
+    try:
+        with path.open('rb') as f:
+            while remaining:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+    except FileNotFoundError:
+        pass
+
+    # the file shrank or disappeared since the archive was planned.
+    if remaining:
+        yield bytes(remaining)
@@ -1,10 +1,10 @@
 import abc
 import asyncio
 from collections import OrderedDict
-from typing import List
+from typing import Dict, List
 
 import discord
-from discord import User, Reaction, Message
+from discord import Message, RawReactionActionEvent
 from discord.ext import commands
 
 FIRST = '\N{BLACK LEFT-POINTING DOUBLE TRIANGLE}'
@@ -13,6 +13,42 @@ NEXT = '\N{BLACK RIGHT-POINTING TRIANGLE}'
 LAST = '\N{BLACK RIGHT-POINTING DOUBLE TRIANGLE}'
 
 
+class ReactionDispatcher:
+    """
+    Routes reaction events to active paginators by message id, so that a reaction only ever reaches the paginator
+    it was meant for, no matter how many paginators are open.
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.paginators: Dict[int, 'Paginator'] = {}
+
+        bot.add_listener(self.on_raw_reaction_add)
+
+    @classmethod
+    def get(cls, bot: commands.Bot) -> 'ReactionDispatcher':
+        """
+        Get the dispatcher for a bot, creating it if it does not exist yet.
+
+        :param bot: The bot.
+        :return: The bot's dispatcher.
+        """
+        if not hasattr(bot, 'reaction_dispatcher'):
+            bot.reaction_dispatcher = cls(bot)
+        return bot.reaction_dispatcher
+
+    def register(self, paginator: 'Paginator'):
+        self.paginators[paginator.msg.id] = paginator
+
+    def unregister(self, paginator: 'Paginator'):
+        self.paginators.pop(paginator.msg.id, None)
+
+    async def on_raw_reaction_add(self, payload: RawReactionActionEvent):
+        paginator = self.paginators.get(payload.message_id)
+        if paginator is not None and paginator._check(payload):
+            paginator._events.put_nowait(payload)
+
+
 class Paginator(abc.ABC):
     def __init__(
             self,
@@ -20,20 +56,25 @@ class Paginator(abc.ABC):
             items: List[str],
             timeout=120,
             header='',
-            enumerate=True):
+            enumerate=True,
+            pages: List[str] = None):
         self.ctx = ctx
         self.items = items
         self.timeout = timeout
         self.header = header.strip()
         self.enumerate = enumerate
 
-        self._pages = None
+        # pages can be passed in if they were already rendered, e.g. from a cache.
+        self._pages = pages
 
         self.page = 0
         self.page_count = len(self.pages)
 
         self.paginating = False
         self.msg: Message = None
+        self.dispatcher = ReactionDispatcher.get(ctx.bot)
+        self._events = asyncio.Queue()
+        self._deadline = None
         self.reactions = {
             FIRST: self.first,
             PREV:  self.prev,
@@ -59,43 +100,70 @@ class Paginator(abc.ABC):
     def _gen_pages(self) -> List[str]:
         pass
 
-    def _check(self, reaction: Reaction, user: User):
-        if reaction.message.id != self.msg.id:
+    def _check(self, payload: RawReactionActionEvent):
+        if payload.user_id == self.ctx.bot.user.id:
             return False
-        if user.bot:
+        if payload.member is not None and payload.member.bot:
             return False
-        if reaction.emoji not in self.reactions.keys():
+        if str(payload.emoji) not in self.reactions.keys():
             return False
         return True
 
+    def _touch(self):
+        """
+        Push the timeout back. Rather than rescheduling a timer on every reaction, only the deadline is moved, and
+        the timer reschedules itself when it finds that the deadline has not passed yet.
+        """
+        self._deadline = self.ctx.bot.loop.time() + self.timeout
+
+    def _expire(self):
+        if not self.paginating:
+            return
+        loop = self.ctx.bot.loop
+        if loop.time() < self._deadline:
+            loop.call_at(self._deadline, self._expire)
+        else:
+            self._events.put_nowait(None)
+
     async def _setup(self):
         await self.first()
 
-        for reaction in self.reactions:
-            await self.msg.add_reaction(reaction)
         self.paginating = True
+        self.dispatcher.register(self)
+        self._touch()
+        self.ctx.bot.loop.call_at(self._deadline, self._expire)
 
-    async def _teardown(self):
-        await self.msg.clear_reactions()
+        # requests to the same bucket are sent in the order they are made, so the reactions still show up in order.
+        await asyncio.gather(*(self.msg.add_reaction(reaction) for reaction in self.reactions))
+
+    def _teardown(self):
         self.paginating = False
+        if self.msg is not None:
+            self.dispatcher.unregister(self)
 
     async def paginate(self):
-        await self._setup()
+        # whatever happens to the message or the task, the dispatcher must not keep hold of the paginator.
+        try:
+            await self._setup()
 
-        while self.paginating:
-            try:
-                reaction, user = await self.ctx.bot.wait_for('reaction_add', check=self._check, timeout=self.timeout)
+            while True:
+                payload = await self._events.get()
+                if payload is None:
+                    break
+
+                self._touch()
 
                 try:
-                    await reaction.remove(user)
+                    await self.msg.remove_reaction(payload.emoji, discord.Object(payload.user_id))
                 except discord.HTTPException:
                     pass
 
-                action = self.reactions[reaction.emoji]
+                action = self.reactions[str(payload.emoji)]
                 await action()
-            except asyncio.TimeoutError:
-                await self._teardown()
-                break
+
+            await self.msg.clear_reactions()
+        finally:
+            self._teardown()
 
     async def first(self):
         await self.goto(0)
@@ -0,0 +1,161 @@
+import asyncio
+import io
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from types import FrameType
+from typing import List, Optional, Tuple
+
+# the deepest stack kept per sample. deeper stacks are cut off at the root.
+MAX_DEPTH = 128
+
+
+class SamplingProfiler:
+    """
+    A statistical profiler for the whole process. Every interval it looks at what every thread is doing and counts
+    the stacks it sees, which costs next to nothing for the threads being looked at.
+
+    The result is in the collapsed stack format, one line per distinct stack, which flamegraph.pl and speedscope turn
+    into flamegraphs.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        """
+        :param interval: Seconds between samples.
+        """
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+
+    def run(self, duration: float):
+        """
+        Sample for a while. Blocks, so run it in its own thread.
+
+        :param duration: Seconds to sample for.
+        """
+        own = threading.get_ident()
+        end = time.perf_counter() + duration
+        while time.perf_counter() < end:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self.stacks[_collapse(names.get(ident, str(ident)), frame)] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+
+    def collapsed(self) -> str:
+        """
+        :return: The samples in the collapsed stack format, most common first.
+        """
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def _collapse(thread: str, frame: Optional[FrameType]) -> str:
+    frames: List[str] = []
+    while frame is not None and len(frames) < MAX_DEPTH:
+        code = frame.f_code
+        frames.append(f'{code.co_name} ({code.co_filename}:{frame.f_lineno})')
+        frame = frame.f_back
+    # semicolons separate frames.
+    frames = [f.replace(';', ':') for f in reversed(frames)]
+    return ';'.join([thread.replace(';', ':'), *frames])
+
+
+class AllocationTracker:
+    """
+    Takes tracemalloc snapshots and compares new ones against the last snapshot taken, to find what memory keeps
+    growing.
+    """
+
+    def __init__(self):
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 1):
+        """
+        Start tracing allocations. Every allocation is slower while tracing, the more so the more frames are kept.
+
+        :param frames: How many frames of each allocation's traceback to keep.
+        """
+        self.baseline = None
+        tracemalloc.start(frames)
+
+    def stop(self):
+        self.baseline = None
+        tracemalloc.stop()
+
+    def traced(self) -> Tuple[int, int]:
+        """
+        :return: The bytes currently traced, and the most that were at once.
+        """
+        return tracemalloc.get_traced_memory()
+
+    def snapshot(self, limit: int = 25) -> str:
+        """
+        Take a snapshot and make it the baseline for diffs.
+
+        :param limit: How many of the biggest allocation sites to show.
+        :return: The biggest allocation sites.
+        """
+        self.baseline = self._take()
+        stats = self.baseline.statistics('traceback')
+        total = sum(stat.size for stat in stats)
+
+        out = io.StringIO()
+        out.write(f'{total / (1 << 20):.1f} MB traced in {sum(stat.count for stat in stats)} blocks.\n\n')
+        for stat in stats[:limit]:
+            out.write(f'{stat.size / 1024:.1f} KB in {stat.count} blocks\n')
+            out.writelines(f'    {line}\n' for line in stat.traceback.format())
+        return out.getvalue()
+
+    def diff(self, limit: int = 25) -> str:
+        """
+        Compare a new snapshot against the baseline.
+
+        :param limit: How many of the most grown allocation sites to show.
+        :return: The allocation sites that grew or shrank the most since the baseline.
+        """
+        if self.baseline is None:
+            raise ValueError('No snapshot to compare against.')
+
+        stats = self._take().compare_to(self.baseline, 'traceback')
+        growth = sum(stat.size_diff for stat in stats)
+
+        out = io.StringIO()
+        out.write(f'{growth / (1 << 20):+.1f} MB since the snapshot.\n\n')
+        for stat in stats[:limit]:
+            out.write(
+                    f'{stat.size_diff / 1024:+.1f} KB ({stat.count_diff:+} blocks), '
+                    f'{stat.size / 1024:.1f} KB in {stat.count} blocks now\n'
+            )
+            out.writelines(f'    {line}\n' for line in stat.traceback.format())
+        return out.getvalue()
+
+    @staticmethod
+    def _take() -> tracemalloc.Snapshot:
+        # allocations made by tracemalloc itself and by the import machinery are just noise.
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<unknown>'),
+        ])
+
+
+def task_stacks(loop: asyncio.AbstractEventLoop = None) -> str:
+    """
+    :return: Where every task on an event loop is suspended, or running.
+    """
+    tasks = asyncio.all_tasks(loop)
+    states = Counter('done' if task.done() else 'pending' for task in tasks)
+
+    out = io.StringIO()
+    out.write(f'{len(tasks)} tasks ({", ".join(f"{count} {state}" for state, count in states.items())}).\n\n')
+    for task in sorted(tasks, key=lambda t: getattr(t.get_coro(), '__qualname__', '')):
+        task.print_stack(file=out)
+        out.write('\n')
+    return out.getvalue()
@@ -11,8 +11,54 @@ class Config:
     database_url: str
     default_prefix: str
     sound_path: str
+    # optional read replica of database_url, for queries that only read.
+    replica_database_url: str = ''
+    # seconds after a guild writes something during which its reads still go to the primary, as the replica lags behind.
+    replica_stickiness: float = 5.0
     extra_extensions: str = ''
     log_level: str = 'INFO'
+    # text, or json for one structured record per line.
+    log_format: str = 'text'
+    # fraction of high-volume records, such as one per command, that are logged.
+    log_sample_rate: float = 1.0
+    # seconds before cached guild settings are fetched again, in case an invalidation from another process was missed.
+    guild_settings_ttl: float = 3600
+    # skip the caches and events the bot has no use for, to save memory on large deployments.
+    lean: bool = False
+    # memory budget in megabytes for decoded audio of frequently played sounds. 0 disables the cache.
+    audio_cache_size: int = 128
+    # where sounds are stored: local, or s3. with s3, sound_path is used as a local cache.
+    storage: str = 'local'
+    s3_bucket: str = ''
+    s3_endpoint_url: str = ''
+    # seconds before a locally cached sound is checked against the bucket again.
+    s3_cache_ttl: float = 300
+    # token bucket admission for !play, !rand and !add, in commands per second and burst size. A rate of 0 disables.
+    guild_rate: float = 1.0
+    guild_burst: int = 5
+    user_rate: float = 0.5
+    user_burst: int = 3
+    # global caps on concurrent ffmpeg decoders and downloads. 0 disables.
+    max_decoders: int = 64
+    max_downloads: int = 4
+    # seconds to wait for a decoder or download slot before giving up.
+    queue_timeout: float = 5.0
+    # send audio for all guilds from this many shared threads instead of one thread per voice client. 0 disables.
+    audio_scheduler_threads: int = 0
+    # encode opus in this many worker processes instead of the threads sending audio. 0 disables.
+    encoder_processes: int = 0
+    # transcode sounds into the canonical format in the background. only one process sharing a library needs this.
+    background_normalize: bool = False
+    # seconds to wait after each sound when normalizing in the background.
+    normalize_throttle: float = 1.0
+    # the highest bitrate sounds are encoded at in kbps. sounds are encoded at the voice channel's bitrate up to this.
+    opus_max_bitrate: int = 128
+    # expected fraction of voice packets lost, which opus spends some bitrate on to recover from. 0 disables that.
+    opus_packet_loss: float = 0.15
+    # seconds the event loop may be blocked for before its stack is logged. 0 disables the watchdog.
+    loop_lag_threshold: float = 0.25
+    # seconds between event loop lag reports in the log. 0 disables them.
+    loop_lag_report_interval: float = 60
 
     @classmethod
     def from_env(cls) -> 'Config':
@@ -22,6 +68,12 @@ class Config:
         for field in dataclasses.fields(cls):
             value = os.getenv('SOUNDBERT_' + field.name.upper())
             if value is not None:
-                fields[field.name] = value
+                fields[field.name] = cls._convert(field.type, value)
 
         return cls(**fields)
+
+    @staticmethod
+    def _convert(type_, value: str):
+        if type_ is bool:
+            return value.lower() in ('1', 'true', 'yes', 'on')
+        return type_(value)
@@ -1,8 +1,32 @@
+import copy
+import sqlite3
+
+from asyncpg import UniqueViolationError
+from databases import Database
 from sqlalchemy import Integer, Table, Column, MetaData, String, Text, BigInteger, DateTime, ForeignKey, Boolean, \
-    text, UniqueConstraint, func, Float
+    text, UniqueConstraint, func, Float, Index
+from sqlalchemy.ext.compiler import compiles
 
 metadata = MetaData()
 
+# what inserting a duplicate raises, with either backend. sqlite doesn't distinguish between constraints.
+UniqueViolation = (UniqueViolationError, sqlite3.IntegrityError)
+
+
+def is_sqlite(db: Database) -> bool:
+    return db.url.dialect == 'sqlite'
+
+
+@compiles(String, 'sqlite')
+def _compile_string_sqlite(type_, compiler, **kw):
+    # sqlite can't define collations in sql, so use its built in case insensitive one instead. unlike the postgres one,
+    # it only folds ascii.
+    if type_.collation == 'case_insensitive':
+        type_ = copy.copy(type_)
+        type_.collation = 'NOCASE'
+    return compiler.visit_string(type_, **kw)
+
+
 guilds = Table(
         'guilds',
         metadata,
@@ -23,7 +47,9 @@ sounds = Table(
         Column('upload_time', DateTime(timezone=True), server_default=func.now(), nullable=False),
         # this cannot be an Interval type until https://github.com/encode/databases/pull/149 is merged, and
         # https://github.com/encode/databases/issues/141 is resolved.
-        Column('length', Float(), nullable=False)
+        Column('length', Float(), nullable=False),
+        # whether the file has been transcoded into the canonical format, see normalize.py.
+        Column('normalized', Boolean(), server_default=text('false'), nullable=False)
 )
 
 sound_names = Table(
@@ -36,3 +62,21 @@ sound_names = Table(
         Column('is_alias', Boolean(), server_default=text('false'), nullable=False),
         UniqueConstraint('sound_id', 'guild_id', 'name')
 )
+
+# name lookups within a guild. names are unique per guild, since they are also file names.
+Index('ix_sound_names_guild_id_name', sound_names.c.guild_id, sound_names.c.name, unique=True)
+# !list and !rand, which only look at sounds and not their aliases.
+Index(
+        'ix_sound_names_guild_id_name_not_alias',
+        sound_names.c.guild_id,
+        sound_names.c.name,
+        postgresql_where=~sound_names.c.is_alias,
+        sqlite_where=~sound_names.c.is_alias
+)
+# fuzzy search. requires the pg_trgm extension, so the migrations only create it on postgres.
+Index(
+        'ix_sound_names_name_trgm',
+        sound_names.c.name,
+        postgresql_using='gin',
+        postgresql_ops={'name': 'gin_trgm_ops'}
+)
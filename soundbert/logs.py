@@ -0,0 +1,114 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from .config import Config
+
+__all__ = ['setup_logging', 'TextFormatter', 'JsonFormatter', 'SamplingFilter']
+
+# attributes every log record has, so anything else was passed in through extra.
+_RECORD_ATTRIBUTES = set(logging.makeLogRecord({}).__dict__) | {'message', 'asctime', 'sample'}
+
+
+def setup_logging(config: Config):
+    """
+    Send all logging through a queue to a background thread, so that formatting and writing records never blocks the
+    event loop.
+
+    :param config: The bot config. log_format chooses between text and json output, and log_sample_rate is the fraction
+                   of high-volume records (those logged with extra={'sample': True}) that are kept.
+    """
+    handler = logging.StreamHandler(sys.stderr)
+    if config.log_format == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(TextFormatter(logging.BASIC_FORMAT))
+
+    records = queue.SimpleQueue()
+    queue_handler = _StructuredQueueHandler(records)
+    # sample before enqueueing, so dropped records cost as little as possible.
+    queue_handler.addFilter(SamplingFilter(config.log_sample_rate))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(queue_handler)
+    root.setLevel(logging.WARNING)
+
+    listener = QueueListener(records, handler, respect_handler_level=True)
+    listener.start()
+    # flush whatever is still queued on the way out.
+    atexit.register(listener.stop)
+
+
+class _StructuredQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # unlike QueueHandler.prepare, don't fold the traceback into the message, so it can be formatted separately.
+        # the message is still rendered here, since its arguments may not be safe to use from another thread.
+        record = logging.makeLogRecord(record.__dict__)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _extra(record: logging.LogRecord) -> dict:
+    return {key: value for key, value in record.__dict__.items() if key not in _RECORD_ATTRIBUTES}
+
+
+class TextFormatter(logging.Formatter):
+    """
+    Formats records as text, followed by anything passed in through extra as key=value pairs.
+    """
+
+    def formatMessage(self, record):
+        message = super(TextFormatter, self).formatMessage(record)
+        fields = ' '.join(f'{key}={value}' for key, value in _extra(record).items() if value is not None)
+        return f'{message} [{fields}]' if fields else message
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line. Anything passed in through extra is included as is.
+    """
+
+    def format(self, record):
+        entry = {
+            'time':    datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level':   record.levelname,
+            'logger':  record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(_extra(record))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of records logged with extra={'sample': True}. Other records are always kept.
+    """
+
+    def __init__(self, rate: float):
+        super(SamplingFilter, self).__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if self.rate < 1 and getattr(record, 'sample', False):
+            return random.random() < self.rate
+        return True
@@ -0,0 +1,217 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+from databases import Database
+from sqlalchemy import and_, select
+
+from .database import sounds, sound_names
+from .storage import Storage
+
+__all__ = ['Normalizer', 'NormalizeReport']
+
+log = logging.getLogger(__name__)
+
+# opus in ogg at discord's own sample rate, so playback only has to demux and decode it; there is nothing to resample.
+TRANSCODE_ARGS = '-vn -sn -dn -map_metadata -1 -ar 48000 -ac 2 -c:a libopus -b:a 96k -f ogg'.split()
+# what playback decodes to.
+DECODE_ARGS = '-f s16le -ar 48000 -ac 2'.split()
+
+
+@dataclass
+class NormalizeReport:
+    normalized: int = 0
+    # already in the canonical format, so only marked as normalized.
+    skipped: int = 0
+    failed: int = 0
+    bytes_before: int = 0
+    bytes_after: int = 0
+    # seconds it took to decode the transcoded sounds before and after.
+    decode_before: float = 0.0
+    decode_after: float = 0.0
+
+    def __str__(self):
+        saved = self.bytes_before - self.bytes_after
+        decode_saved = self.decode_before - self.decode_after
+        return (
+            f'Normalized {self.normalized} sounds ({self.skipped} already normalized, {self.failed} failed). '
+            f'Saved {saved / (1 << 20):.1f} MB of {self.bytes_before / (1 << 20):.1f} MB and '
+            f'{decode_saved:.1f}s of {self.decode_before:.1f}s decoding.'
+        )
+
+
+class Normalizer:
+    """
+    Transcodes sounds into one canonical format, so that every sound is equally cheap to decode and no bigger than it
+    needs to be.
+
+    Sounds are marked as normalized as they are done, in the same transaction that swaps in the new file, so a run can
+    be stopped at any point and picks up where it left off.
+    """
+
+    def __init__(self, db: Database, storage: Storage, throttle: float = 0.0, batch_size: int = 100):
+        """
+        :param db: The database.
+        :param storage: Where the sounds are.
+        :param throttle: Seconds to wait after each sound, to leave the machine to more important things.
+        :param batch_size: How many sounds to look up at a time.
+        """
+        self.db = db
+        self.storage = storage
+        self.throttle = throttle
+        self.batch_size = batch_size
+
+    async def run(self, limit: Optional[int] = None) -> NormalizeReport:
+        """
+        Normalize every sound that isn't yet.
+
+        :param limit: Stop after this many sounds.
+        :return: What was done.
+        """
+        report = NormalizeReport()
+        done = 0
+        last_id = 0
+        while limit is None or done < limit:
+            batch = await self.db.fetch_all(
+                    select([sounds.c.id, sound_names.c.guild_id, sound_names.c.name])
+                        .select_from(sounds.join(sound_names))
+                        .where(and_(
+                            sounds.c.id > last_id,
+                            ~sounds.c.normalized,
+                            ~sound_names.c.is_alias
+                    ))
+                        .order_by(sounds.c.id)
+                        .limit(self.batch_size)
+            )
+            if not batch:
+                break
+
+            for record in batch:
+                if limit is not None and done >= limit:
+                    break
+                last_id = record[sounds.c.id]
+                done += 1
+
+                try:
+                    await self.normalize(
+                            record[sounds.c.id],
+                            record[sound_names.c.guild_id],
+                            record[sound_names.c.name],
+                            report
+                    )
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    log.exception(f'Failed to normalize sound {record[sounds.c.id]}.')
+                    report.failed += 1
+
+                if self.throttle:
+                    await asyncio.sleep(self.throttle)
+
+        return report
+
+    async def normalize(self, sound_id: int, guild_id: int, name: str, report: NormalizeReport):
+        path = await self.storage.fetch(guild_id, name)
+
+        if await self._is_canonical(path):
+            await self._mark(sound_id)
+            report.skipped += 1
+            return
+
+        fd, temp = tempfile.mkstemp(prefix=f'.{name}.', suffix='.normalizing', dir=str(path.parent))
+        os.close(fd)
+        temp = Path(temp)
+        try:
+            await _ffmpeg(['-i', str(path), *TRANSCODE_ARGS, '-y', str(temp)])
+
+            decode_before = await _decode_time(path)
+            decode_after = await _decode_time(temp)
+            size_before = path.stat().st_size
+            size_after = temp.stat().st_size
+
+            async with self.db.transaction():
+                # lock the name, so that the sound can't be renamed or deleted from under the new file.
+                current = await self.db.fetch_val(
+                        select([sound_names.c.id])
+                            .where(and_(
+                                sound_names.c.sound_id == sound_id,
+                                sound_names.c.guild_id == guild_id,
+                                sound_names.c.name == name
+                        ))
+                            .with_for_update()
+                )
+                if current is None:
+                    log.debug(f'Sound {sound_id} changed while being normalized; leaving it for the next run.')
+                    return
+
+                await self._mark(sound_id)
+                await self.storage.put(guild_id, name, temp)
+                # aliases that are copies rather than links need to be made again.
+                aliases = await self.db.fetch_all(
+                        select([sound_names.c.name])
+                            .where(and_(
+                                sound_names.c.sound_id == sound_id,
+                                sound_names.c.is_alias
+                        ))
+                )
+                if aliases:
+                    await self.storage.link(guild_id, [(alias[sound_names.c.name], name) for alias in aliases])
+        finally:
+            temp.unlink(missing_ok=True)
+
+        log.debug(
+                f'Normalized sound {sound_id} from {size_before} to {size_after} bytes, '
+                f'decoding in {decode_after:.3f}s instead of {decode_before:.3f}s.'
+        )
+        report.normalized += 1
+        report.bytes_before += size_before
+        report.bytes_after += size_after
+        report.decode_before += decode_before
+        report.decode_after += decode_after
+
+    async def _mark(self, sound_id: int):
+        await self.db.execute(sounds.update().values(normalized=True).where(sounds.c.id == sound_id))
+
+    @staticmethod
+    async def _is_canonical(path: Path) -> bool:
+        proc = await asyncio.create_subprocess_exec(
+                'ffprobe', '-v', 'error', '-select_streams', 'a:0',
+                '-show_entries', 'stream=codec_name,sample_rate:format=format_name', '-of', 'json', str(path),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL
+        )
+        out, _ = await proc.communicate()
+        try:
+            probe = json.loads(out)
+            stream, = probe['streams']
+            return (
+                    stream['codec_name'] == 'opus'
+                    and stream['sample_rate'] == '48000'
+                    and probe['format']['format_name'] == 'ogg'
+            )
+        except (ValueError, KeyError):
+            return False
+
+
+async def _ffmpeg(args: List[str], stdout=asyncio.subprocess.DEVNULL):
+    # one thread, so that a background run doesn't compete with playback for every core.
+    proc = await asyncio.create_subprocess_exec(
+            'ffmpeg', '-nostdin', '-loglevel', 'error', '-threads', '1', *args,
+            stdout=stdout,
+            stderr=asyncio.subprocess.PIPE
+    )
+    _, err = await proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError(f'ffmpeg exited with {proc.returncode}: {err.decode(errors="replace").strip()}')
+
+
+async def _decode_time(path: Path) -> float:
+    start = time.perf_counter()
+    await _ffmpeg(['-i', str(path), *DECODE_ARGS, '-'])
+    return time.perf_counter() - start
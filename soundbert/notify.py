@@ -0,0 +1,142 @@
+import asyncio
+import json
+import logging
+import uuid
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+import asyncpg
+from sqlalchemy import func, select
+
+from .database import is_sqlite
+
+__all__ = ['Notifier']
+
+log = logging.getLogger(__name__)
+
+CHANNEL = 'soundbert_invalidate'
+# seconds between checks that the listening connection is still alive.
+HEALTH_CHECK_INTERVAL = 10
+RECONNECT_DELAY = 5
+
+
+class Notifier:
+    """
+    Keeps the caches of several bot processes sharing one database coherent. Whatever changes cached data publishes
+    an invalidation, which is applied in this process straight away and sent to every other process over a Postgres
+    notification channel.
+
+    Notifications sent while a process is disconnected from the channel are lost, so it flushes its caches whenever it
+    (re)connects. With SQLite there is only ever one process, so invalidations are just applied locally.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        # tells this process' own notifications apart from everyone else's.
+        self.origin = uuid.uuid4().hex
+        self.handlers: Dict[str, List[Callable]] = defaultdict(list)
+        self.flush_handlers: List[Callable[[], None]] = []
+
+        self._task: Optional[asyncio.Task] = None
+        self._conn: Optional[asyncpg.Connection] = None
+
+    @property
+    def enabled(self) -> bool:
+        return not is_sqlite(self.bot.db)
+
+    def subscribe(self, kind: str, handler: Callable, flush: Callable[[], None] = None):
+        """
+        :param kind: The kind of invalidation to handle.
+        :param handler: Called with the invalidation's fields as keyword arguments.
+        :param flush: Called to drop everything cached, when invalidations may have been missed.
+        """
+        self.handlers[kind].append(handler)
+        if flush is not None:
+            self.flush_handlers.append(flush)
+
+    def unsubscribe(self, kind: str, handler: Callable, flush: Callable[[], None] = None):
+        self.handlers[kind].remove(handler)
+        if flush is not None:
+            self.flush_handlers.remove(flush)
+
+    async def publish(self, kind: str, **fields):
+        """
+        Invalidate something in every process. Call it after the change has been committed, not inside its
+        transaction: this process' caches are invalidated straight away, and anything that refilled them before the
+        commit would put the old data right back.
+
+        :param kind: The kind of invalidation.
+        :param fields: Passed to the handlers. Must be JSON serializable.
+        """
+        self._apply(kind, fields)
+        if self.enabled:
+            message = json.dumps({'origin': self.origin, 'kind': kind, 'fields': fields})
+            await self.bot.db.execute(select([func.pg_notify(CHANNEL, message)]))
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._task = self.bot.loop.create_task(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._disconnect()
+
+    async def _listen(self):
+        # asyncpg doesn't understand driver suffixes like postgresql+asyncpg://.
+        dsn = 'postgresql://' + self.bot.config.database_url.split('://', 1)[1]
+
+        while True:
+            try:
+                self._conn = await asyncpg.connect(dsn)
+                await self._conn.add_listener(CHANNEL, self._receive)
+                log.debug(f'Listening for cache invalidations on {CHANNEL}.')
+                self._flush()
+
+                while True:
+                    await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+                    await self._conn.fetchval('SELECT 1')
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception(f'Lost the connection to {CHANNEL}, reconnecting in {RECONNECT_DELAY}s.')
+                await self._disconnect()
+                await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _disconnect(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            try:
+                await conn.close()
+            except Exception:
+                conn.terminate()
+
+    def _receive(self, _conn, _pid, _channel, payload: str):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            log.warning(f'Ignoring malformed notification on {CHANNEL}: {payload}')
+            return
+
+        if message.get('origin') == self.origin:
+            return
+        self._apply(message['kind'], message['fields'])
+
+    def _apply(self, kind: str, fields: dict):
+        for handler in self.handlers[kind]:
+            try:
+                handler(**fields)
+            except Exception:
+                log.exception(f'Failed to apply {kind} invalidation {fields}.')
+
+    def _flush(self):
+        for flush in self.flush_handlers:
+            try:
+                flush()
+            except Exception:
+                log.exception('Failed to flush a cache.')
@@ -0,0 +1,123 @@
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from databases import Database
+from discord.ext import commands
+
+__all__ = ['QueryCounts', 'InstrumentedDatabase', 'counting', 'query_budget', 'check_budget']
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class QueryCounts:
+    # statements sent to the database.
+    queries: int = 0
+    # waits on the database, including beginning and ending transactions.
+    round_trips: int = 0
+
+
+_counts: ContextVar[Optional[QueryCounts]] = ContextVar('query_counts', default=None)
+
+
+def _record(queries: int, round_trips: int):
+    counts = _counts.get()
+    if counts is not None:
+        counts.queries += queries
+        counts.round_trips += round_trips
+
+
+@contextmanager
+def counting() -> Iterator[QueryCounts]:
+    """
+    Count the queries made by the current task, and any tasks it starts, until the block exits.
+    """
+    counts = QueryCounts()
+    token = _counts.set(counts)
+    try:
+        yield counts
+    finally:
+        _counts.reset(token)
+
+
+class InstrumentedDatabase(Database):
+    """
+    A Database that counts the queries and round trips made inside counting() blocks. Outside of them it behaves
+    exactly like a Database.
+    """
+
+    async def execute(self, query, values=None):
+        _record(1, 1)
+        return await super(InstrumentedDatabase, self).execute(query, values)
+
+    async def execute_many(self, query, values):
+        _record(len(values), len(values))
+        return await super(InstrumentedDatabase, self).execute_many(query, values)
+
+    async def fetch_all(self, query, values=None):
+        _record(1, 1)
+        return await super(InstrumentedDatabase, self).fetch_all(query, values)
+
+    async def fetch_one(self, query, values=None):
+        _record(1, 1)
+        return await super(InstrumentedDatabase, self).fetch_one(query, values)
+
+    async def fetch_val(self, query, values=None, column=0):
+        _record(1, 1)
+        return await super(InstrumentedDatabase, self).fetch_val(query, values, column=column)
+
+    async def iterate(self, query, values=None):
+        _record(1, 1)
+        async for record in super(InstrumentedDatabase, self).iterate(query, values):
+            yield record
+
+    def transaction(self, *args, **kwargs):
+        # begin, and commit or rollback.
+        _record(0, 2)
+        return super(InstrumentedDatabase, self).transaction(*args, **kwargs)
+
+
+def query_budget(round_trips: int):
+    """
+    Declare how many database round trips a command may make per invocation, including its checks, converters and
+    prefix lookup. Invocations that go over are logged as warnings.
+
+    Can be used above or below the command decorator.
+
+    :param round_trips: The budget.
+    """
+
+    def decorator(func):
+        if isinstance(func, commands.Command):
+            func.callback.__query_budget__ = round_trips
+        else:
+            func.__query_budget__ = round_trips
+        return func
+
+    return decorator
+
+
+def check_budget(ctx: commands.Context, counts: QueryCounts):
+    """
+    Warn if a command invocation went over its query budget.
+
+    :param ctx: The command context.
+    :param counts: What the invocation did.
+    """
+    if ctx.command is None:
+        budget = 0
+    else:
+        budget = getattr(ctx.command.callback, '__query_budget__', None)
+        if budget is None:
+            return
+
+    if counts.round_trips > budget:
+        name = ctx.command.qualified_name if ctx.command is not None else 'Non-command message'
+        log.warning(
+                f'{name} made {counts.round_trips} database round trips ({counts.queries} queries), '
+                f'over its budget of {budget}.',
+                extra={'command': name, 'round_trips': counts.round_trips, 'queries': counts.queries}
+        )
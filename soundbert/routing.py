@@ -0,0 +1,170 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from sqlalchemy.sql import Select
+
+from .querycount import InstrumentedDatabase
+
+__all__ = ['RoutingDatabase', 'for_guild']
+
+# the guild the current task is working for, if any.
+_guild: ContextVar[Optional[int]] = ContextVar('routing_guild', default=None)
+# how many transactions the current task is inside of.
+_transactions: ContextVar[int] = ContextVar('routing_transactions', default=0)
+
+
+@contextmanager
+def for_guild(guild_id: Optional[int]) -> Iterator[None]:
+    """
+    Attribute the queries made by the current task, and any tasks it starts, to a guild, so that the guild reads its
+    own writes.
+    """
+    token = _guild.set(guild_id)
+    try:
+        yield
+    finally:
+        _guild.reset(token)
+
+
+class RoutingDatabase(InstrumentedDatabase):
+    """
+    A database that sends reads to a read replica and everything else to the primary.
+
+    Only SELECTs made with fetch_all, fetch_one, fetch_val and iterate outside of a transaction go to the replica.
+    Replicas lag behind a little, so once a guild writes anything, its reads go to the primary for a while too. The
+    same goes for writes made by other processes, which this one learns about through their cache invalidations.
+    """
+
+    def __init__(self, url: str, replica_url: str, stickiness: float = 5.0):
+        """
+        :param url: The primary's URL.
+        :param replica_url: The replica's URL.
+        :param stickiness: Seconds after a guild's last write during which its reads still go to the primary.
+        """
+        super(RoutingDatabase, self).__init__(url)
+        self.replica = InstrumentedDatabase(replica_url)
+        self.stickiness = stickiness
+        # guild id -> when it last wrote. expired entries are dropped when the guild reads, or by the next sweep.
+        self._written: Dict[int, float] = {}
+        self._swept = time.monotonic()
+        # when invalidations may last have been missed, which could be for any guild.
+        self._flushed: Optional[float] = None
+
+    async def connect(self):
+        await asyncio.gather(super(RoutingDatabase, self).connect(), self.replica.connect())
+
+    async def disconnect(self):
+        await asyncio.gather(super(RoutingDatabase, self).disconnect(), self.replica.disconnect())
+
+    async def execute(self, query, values=None):
+        self._wrote(query)
+        return await super(RoutingDatabase, self).execute(query, values)
+
+    async def execute_many(self, query, values):
+        self._wrote(query)
+        return await super(RoutingDatabase, self).execute_many(query, values)
+
+    async def fetch_all(self, query, values=None):
+        return await self._route(query).fetch_all(query, values)
+
+    async def fetch_one(self, query, values=None):
+        return await self._route(query).fetch_one(query, values)
+
+    async def fetch_val(self, query, values=None, column=0):
+        return await self._route(query).fetch_val(query, values, column=column)
+
+    async def iterate(self, query, values=None):
+        async for record in self._route(query).iterate(query, values):
+            yield record
+
+    def transaction(self, *args, **kwargs):
+        self._wrote(None)
+        return _RoutedTransaction(super(RoutingDatabase, self).transaction(*args, **kwargs))
+
+    def invalidated(self, guild_id: int, **fields):
+        """
+        Notifier handler. Something of a guild's was changed, possibly by another process, and the caches that were
+        just dropped must not be refilled from a replica that hasn't caught up yet.
+
+        :param guild_id: The guild whose data changed.
+        """
+        self._mark(guild_id)
+
+    def flushed(self):
+        """
+        Notifier flush handler. Invalidations may have been missed, so every read goes to the primary for a while.
+        """
+        self._flushed = time.monotonic()
+
+    def _route(self, query):
+        if self._readable(query):
+            return self.replica
+        self._wrote(query)
+        return super(RoutingDatabase, self)
+
+    def _readable(self, query) -> bool:
+        """
+        :return: Whether a query can go to the replica.
+        """
+        if not isinstance(query, Select) or _transactions.get() > 0:
+            return False
+        if self._flushed is not None and time.monotonic() - self._flushed < self.stickiness:
+            return False
+
+        guild_id = _guild.get()
+        if guild_id is None:
+            return True
+        written = self._written.get(guild_id)
+        if written is None:
+            return True
+        if time.monotonic() - written < self.stickiness:
+            return False
+        # only recent writes matter, so guilds don't pile up here.
+        del self._written[guild_id]
+        return True
+
+    def _wrote(self, query):
+        # reads that had to go to the primary anyway don't count.
+        if isinstance(query, Select):
+            return
+        guild_id = _guild.get()
+        if guild_id is not None:
+            self._mark(guild_id)
+
+    def _mark(self, guild_id: int):
+        now = time.monotonic()
+        self._written[guild_id] = now
+
+        # guilds that are written to but never read from here, e.g. through invalidations from other processes, would
+        # otherwise stay forever. sweeping once per stickiness period keeps this to the guilds written to recently.
+        if now - self._swept >= self.stickiness:
+            self._swept = now
+            for expired in [guild for guild, written in self._written.items() if now - written >= self.stickiness]:
+                del self._written[expired]
+
+
+class _RoutedTransaction:
+    """
+    Keeps every query made inside a transaction on the primary, where the transaction is.
+    """
+
+    def __init__(self, transaction):
+        self.transaction = transaction
+        self._token = None
+
+    async def __aenter__(self):
+        self._token = _transactions.set(_transactions.get() + 1)
+        try:
+            return await self.transaction.__aenter__()
+        except BaseException:
+            _transactions.reset(self._token)
+            raise
+
+    async def __aexit__(self, *exc_info):
+        try:
+            return await self.transaction.__aexit__(*exc_info)
+        finally:
+            _transactions.reset(self._token)
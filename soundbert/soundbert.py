@@ -1,17 +1,21 @@
 import asyncio
 import logging
 import platform
+import time
+
+from typing import Dict, Mapping, Tuple
 
-from async_lru import alru_cache
-from asyncpg import UniqueViolationError
-from databases import Database
 from discord import Message
 from discord.ext import commands
 from sqlalchemy import select
 
 from .cogs.utils.reactions import err, warn
 from .config import Config
-from .database import guilds
+from .database import UniqueViolation, guilds, is_sqlite
+from .notify import Notifier
+from .querycount import InstrumentedDatabase, check_budget, counting
+from .routing import RoutingDatabase, for_guild
+from .watchdog import LoopWatchdog
 
 __all__ = ['SoundBert']
 
@@ -21,12 +25,103 @@ log = logging.getLogger(__name__)
 class SoundBert(commands.Bot):
     def __init__(self, config: Config):
         self._ensure_event_loop()
-        super().__init__(command_prefix=SoundBert._get_guild_prefix)
+
+        options = {}
+        if config.lean:
+            # the bot only needs guilds, the invoking member's roles and voice states, all of which arrive with the
+            # events it handles anyway. it never looks at old messages, other members or presences.
+            options.update(
+                    max_messages=None,
+                    fetch_offline_members=False,
+                    guild_subscriptions=False
+            )
+
+        super().__init__(command_prefix=SoundBert._get_guild_prefix, **options)
 
         self.config = config
-        self.db = Database(config.database_url)
-        self.loop.run_until_complete(self.db.connect())
+        if config.replica_database_url:
+            self.db = RoutingDatabase(config.database_url, config.replica_database_url, config.replica_stickiness)
+        else:
+            self.db = InstrumentedDatabase(config.database_url)
+        # guild id -> (row, when it was fetched)
+        self._guild_settings: Dict[int, Tuple[Mapping, float]] = {}
+
+        self.notifier = Notifier(self)
+        self.notifier.subscribe('guild', self.invalidate_guild_settings, flush=self._guild_settings.clear)
+        if isinstance(self.db, RoutingDatabase):
+            # other processes' writes only show up as invalidations, and the replica may not have them yet.
+            self.notifier.subscribe('guild', self.db.invalidated, flush=self.db.flushed)
+            self.notifier.subscribe('sounds', self.db.invalidated)
+
+        self.watchdog = None
+        if config.loop_lag_threshold:
+            self.watchdog = LoopWatchdog(
+                    self.loop,
+                    threshold=config.loop_lag_threshold,
+                    report_interval=config.loop_lag_report_interval
+            )
+
+    def run(self):
+        super(SoundBert, self).run(self.config.token)
+
+    async def start(self, *args, **kwargs):
+        """
+        Connects to the database and logs in while extensions are loading, then connects to the gateway.
+        """
+        bot = kwargs.pop('bot', True)
+        reconnect = kwargs.pop('reconnect', True)
 
+        # started first, so that whatever blocks during startup is caught too.
+        if self.watchdog is not None:
+            self.watchdog.start()
+
+        timings = {}
+        started = time.perf_counter()
+
+        async def timed(name, coro):
+            start = time.perf_counter()
+            await coro
+            timings[name] = time.perf_counter() - start
+
+        connect_db = self.loop.create_task(timed('database', self._connect_db()))
+        login = self.loop.create_task(timed('login', self.login(*args, bot=bot)))
+        # give both a chance to send their first requests before extension loading blocks the loop.
+        await asyncio.sleep(0)
+
+        try:
+            await timed('extensions', self._load_extensions())
+        except BaseException:
+            connect_db.cancel()
+            login.cancel()
+            # waited for, so that whatever they failed with is retrieved, and a connection they were in the middle of
+            # opening is either finished or abandoned before close() looks at it.
+            await asyncio.gather(connect_db, login, return_exceptions=True)
+            raise
+        await asyncio.gather(connect_db, login)
+
+        log.info(
+                f'Ready to connect after {time.perf_counter() - started:.3f}s '
+                f'(database {timings["database"]:.3f}s, login {timings["login"]:.3f}s, '
+                f'extensions {timings["extensions"]:.3f}s).'
+        )
+        await self.connect(reconnect=reconnect)
+
+    async def _connect_db(self):
+        await self.db.connect()
+        if is_sqlite(self.db):
+            # lets commands read while something else is being written. this is stored in the database file.
+            await self.db.execute('PRAGMA journal_mode=WAL')
+        self.notifier.start()
+
+    async def close(self):
+        await super(SoundBert, self).close()
+        await self.notifier.stop()
+        if self.watchdog is not None:
+            self.watchdog.stop()
+        if self.db.is_connected:
+            await self.db.disconnect()
+
+    async def _load_extensions(self):
         base_extensions = [
             'soundbert.cogs.soundboard',
             'soundbert.cogs.info',
@@ -42,6 +137,8 @@ class SoundBert(commands.Bot):
         log.info('Loading extra extensions.')
         for ext in self.config.extra_extensions.split(','):
             ext = ext.strip()
+            if not ext:
+                continue
             try:
                 self.load_extension(ext)
             except commands.ExtensionNotFound:
@@ -49,9 +146,6 @@ class SoundBert(commands.Bot):
             else:
                 log.debug(f'Loaded {ext}.')
 
-    def run(self):
-        super(SoundBert, self).run(self.config.token)
-
     @staticmethod
     def _ensure_event_loop():
         """
@@ -68,6 +162,21 @@ class SoundBert(commands.Bot):
             except ImportError:
                 pass
 
+    async def process_commands(self, message: Message):
+        """
+        Same as commands.Bot.process_commands, but counts the database queries made for each message, and attributes
+        them to the message's guild. The counts are available as ctx.queries.
+        """
+        if message.author.bot:
+            return
+
+        with counting() as counts, for_guild(message.guild.id if message.guild is not None else None):
+            ctx = await self.get_context(message)
+            ctx.queries = counts
+            await self.invoke(ctx)
+
+        check_budget(ctx, counts)
+
     async def _get_guild_prefix(self, msg: Message):
         """
         Implementation for command_prefix.
@@ -75,23 +184,45 @@ class SoundBert(commands.Bot):
         :param msg: The message that might have a command.
         :return: The prefix
         """
-        await self._ensure_guild(msg.guild.id)
-        prefix = await self.db.fetch_val(select([guilds.c.prefix]).where(guilds.c.id == msg.guild.id))
-        return commands.when_mentioned_or(prefix)(self, msg)
+        settings = await self.guild_settings(msg.guild.id)
+        return commands.when_mentioned_or(settings[guilds.c.prefix])(self, msg)
 
-    @alru_cache(maxsize=2048)
-    async def _ensure_guild(self, guild_id: int):
+    async def guild_settings(self, guild_id: int) -> Mapping:
         """
-        Ensures that the guild is in the database. Uses an LRU cache to try to not ping the database too much.
+        Get a guild's row from the guilds table, adding it if it isn't there yet. Rows are cached, since they are
+        needed for every message. Whatever changes a row must publish a guild invalidation through the notifier, so
+        that every process drops its copy.
 
         :param guild_id: The guild id
+        :return: The row.
         """
-        log.debug(f'Ensuring guild {guild_id} is in database.')
-        query = guilds.insert().values(id=guild_id, prefix=self.config.default_prefix)
         try:
-            await self.db.execute(query)
-        except UniqueViolationError:
+            settings, fetched = self._guild_settings[guild_id]
+        except KeyError:
             pass
+        else:
+            # invalidations are only a backstop against missed notifications, so this can be long.
+            if time.monotonic() - fetched < self.config.guild_settings_ttl:
+                return settings
+
+        query = select([guilds]).where(guilds.c.id == guild_id)
+        settings = await self.db.fetch_one(query)
+        if settings is None:
+            log.debug(f'Adding guild {guild_id} to database.')
+            try:
+                await self.db.execute(guilds.insert().values(id=guild_id, prefix=self.config.default_prefix))
+            except UniqueViolation:
+                pass
+            settings = await self.db.fetch_one(query)
+
+        self._guild_settings[guild_id] = (settings, time.monotonic())
+        return settings
+
+    def invalidate_guild_settings(self, guild_id: int):
+        self._guild_settings.pop(guild_id, None)
+
+    async def on_guild_remove(self, guild):
+        self.invalidate_guild_settings(guild.id)
 
     async def on_command_error(self, ctx: commands.Context, exception: commands.CommandError):
         """
@@ -100,15 +231,12 @@ class SoundBert(commands.Bot):
         :param ctx: Command context
         :param exception: What went wrong
         """
-        log_msg = (
-            f'In guild {ctx.guild.name}, channel {ctx.channel.name}, '
-            f'{ctx.author.name} executed {ctx.message.content}, but encountered exception: {exception}'
-        )
+        log_msg = f'Command {ctx.message.id} failed: {exception}'
         if isinstance(exception, (commands.UserInputError, commands.CheckFailure, commands.CommandOnCooldown)):
-            log.debug(log_msg)
+            log.debug(log_msg, extra=self._log_context(ctx, sample=True))
             await warn(ctx)
         else:
-            log.exception(log_msg, exc_info=exception)
+            log.error(log_msg, exc_info=exception, extra=self._log_context(ctx))
             await err(ctx)
 
         if len(exception.args) > 0:
@@ -124,7 +252,22 @@ class SoundBert(commands.Bot):
 
         :param ctx: Command context
         """
-        log.info(
-                f'In guild {ctx.guild.name}, channel {ctx.channel.name}, '
-                f'{ctx.author.name} executed {ctx.message.content}'
-        )
+        log.info(f'Command {ctx.message.id} invoked.', extra=self._log_context(ctx, sample=True))
+
+    @staticmethod
+    def _log_context(ctx: commands.Context, sample=False) -> dict:
+        """
+        Structured fields describing a command invocation, for log records. IDs are logged rather than names, since
+        they are cheaper to get and don't change.
+
+        :param ctx: Command context
+        :param sample: Whether the record may be dropped by log sampling.
+        """
+        return {
+            'command':    ctx.command.qualified_name if ctx.command is not None else None,
+            'guild_id':   ctx.guild.id if ctx.guild is not None else None,
+            'channel_id': ctx.channel.id,
+            'author_id':  ctx.author.id,
+            'message_id': ctx.message.id,
+            'sample':     sample
+        }
@@ -0,0 +1,294 @@
+import abc
+import asyncio
+import logging
+import os
+import shutil
+import threading
+import time
+from functools import partial
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from .config import Config
+
+__all__ = ['Storage', 'LocalStorage', 'S3Storage']
+
+log = logging.getLogger(__name__)
+
+
+class Storage(abc.ABC):
+    """
+    Where sound files are kept. Sounds are addressed by guild and name, and aliases are names that refer to another
+    sound's file. Every method is a coroutine that does its blocking work in an executor, so that slow or networked
+    storage never stalls the event loop.
+    """
+
+    @staticmethod
+    def from_config(config: Config) -> 'Storage':
+        if config.storage == 'local':
+            return LocalStorage(Path(config.sound_path))
+        elif config.storage == 's3':
+            return S3Storage(
+                    bucket=config.s3_bucket,
+                    cache_path=Path(config.sound_path),
+                    endpoint_url=config.s3_endpoint_url or None,
+                    cache_ttl=config.s3_cache_ttl
+            )
+        else:
+            raise ValueError(f'Unknown storage backend {config.storage}.')
+
+    @abc.abstractmethod
+    async def exists(self, guild_id: int, name: str) -> bool:
+        pass
+
+    @abc.abstractmethod
+    async def put(self, guild_id: int, name: str, file: Path):
+        """
+        Move a local file into storage, replacing whatever was there.
+
+        :param guild_id: The guild ID.
+        :param name: The name to store it as.
+        :param file: The file. It is moved, not copied.
+        """
+        pass
+
+    @abc.abstractmethod
+    async def link(self, guild_id: int, links: List[Tuple[str, str]]):
+        """
+        Make aliases refer to sounds, replacing whatever was there.
+
+        :param guild_id: The guild ID.
+        :param links: Pairs of alias names and the names of the sounds they refer to.
+        """
+        pass
+
+    @abc.abstractmethod
+    async def move(self, guild_id: int, moves: List[Tuple[str, str]]):
+        """
+        Rename sounds or aliases. Aliases of a renamed sound must be linked again afterwards.
+
+        :param guild_id: The guild ID.
+        :param moves: Pairs of old and new names.
+        """
+        pass
+
+    @abc.abstractmethod
+    async def delete(self, guild_id: int, names: List[str]):
+        """
+        Delete sounds or aliases. Names that don't exist are ignored.
+
+        :param guild_id: The guild ID.
+        :param names: The names to delete.
+        """
+        pass
+
+    @abc.abstractmethod
+    async def fetch(self, guild_id: int, name: str) -> Path:
+        """
+        Get a local path that a sound can be read from, e.g. by ffmpeg.
+
+        :param guild_id: The guild ID.
+        :param name: The name of the sound or alias.
+        :return: The local path.
+        """
+        pass
+
+    @staticmethod
+    async def _run(func, *args):
+        return await asyncio.get_event_loop().run_in_executor(None, partial(func, *args))
+
+
+class LocalStorage(Storage):
+    """
+    Stores sounds in a local directory, with one directory per guild. Aliases are symbolic links.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+
+        if not self.root.is_dir():
+            self.root.mkdir()
+
+    def path(self, guild_id: int, name: str) -> Path:
+        return self.root / str(guild_id) / name
+
+    async def exists(self, guild_id, name):
+        return await self._run(self.path(guild_id, name).exists)
+
+    async def put(self, guild_id, name, file):
+        def put():
+            path = self.path(guild_id, name)
+            path.parent.mkdir(exist_ok=True)
+            # allows this to work on docker
+            shutil.move(str(file), str(path))
+
+        await self._run(put)
+
+    async def link(self, guild_id, links):
+        def link():
+            for alias, target in links:
+                path = self.path(guild_id, alias)
+                path.unlink(missing_ok=True)
+                path.symlink_to(target)
+
+        await self._run(link)
+
+    async def move(self, guild_id, moves):
+        def move():
+            for name, new_name in moves:
+                shutil.move(str(self.path(guild_id, name)), str(self.path(guild_id, new_name)))
+
+        await self._run(move)
+
+    async def delete(self, guild_id, names):
+        def delete():
+            for name in names:
+                self.path(guild_id, name).unlink(missing_ok=True)
+
+        await self._run(delete)
+
+    async def fetch(self, guild_id, name):
+        return self.path(guild_id, name)
+
+
+class S3Storage(Storage):
+    """
+    Stores sounds in an S3-compatible bucket, under guild_id/name keys, so that several bot processes can share one
+    library. Aliases are server-side copies of the sound they refer to.
+
+    Sounds are downloaded into a local cache directory the first time they are played. Cached copies are trusted for
+    cache_ttl seconds, after which they are checked against the bucket before being used again.
+
+    Credentials are read from the usual AWS environment variables or configuration files. endpoint_url can point to
+    any S3-compatible service, e.g. a local MinIO server.
+    """
+
+    def __init__(self, bucket: str, cache_path: Path, endpoint_url: str = None, cache_ttl: float = 300):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError('The s3 storage backend requires boto3. Install soundbert[s3].')
+
+        self.bucket = bucket
+        self.cache_path = cache_path
+        self.cache_ttl = cache_ttl
+        self.client = boto3.client('s3', endpoint_url=endpoint_url)
+
+        # local path -> (etag, when it was last checked). evictions happen in executor threads, so it is locked.
+        self._cached: Dict[Path, Tuple[str, float]] = {}
+        self._cached_lock = threading.Lock()
+        # local path -> the download of it that is in progress, which concurrent fetches of the same sound wait on.
+        self._fetching: Dict[Path, asyncio.Future] = {}
+
+        if not self.cache_path.is_dir():
+            self.cache_path.mkdir()
+
+    @staticmethod
+    def key(guild_id: int, name: str) -> str:
+        return f'{guild_id}/{name}'
+
+    def cached_path(self, guild_id: int, name: str) -> Path:
+        return self.cache_path / str(guild_id) / name
+
+    async def exists(self, guild_id, name):
+        from botocore.exceptions import ClientError
+
+        try:
+            await self._run(partial(self.client.head_object, Bucket=self.bucket, Key=self.key(guild_id, name)))
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                return False
+            raise
+        return True
+
+    async def put(self, guild_id, name, file):
+        def put():
+            self.client.upload_file(str(file), self.bucket, self.key(guild_id, name))
+            self._evict(guild_id, name)
+            file.unlink()
+
+        await self._run(put)
+
+    async def link(self, guild_id, links):
+        def link():
+            for alias, target in links:
+                self.client.copy_object(
+                        Bucket=self.bucket,
+                        Key=self.key(guild_id, alias),
+                        CopySource={'Bucket': self.bucket, 'Key': self.key(guild_id, target)}
+                )
+                self._evict(guild_id, alias)
+
+        await self._run(link)
+
+    async def move(self, guild_id, moves):
+        def move():
+            for name, new_name in moves:
+                self.client.copy_object(
+                        Bucket=self.bucket,
+                        Key=self.key(guild_id, new_name),
+                        CopySource={'Bucket': self.bucket, 'Key': self.key(guild_id, name)}
+                )
+                self.client.delete_object(Bucket=self.bucket, Key=self.key(guild_id, name))
+                self._evict(guild_id, name)
+                self._evict(guild_id, new_name)
+
+        await self._run(move)
+
+    async def delete(self, guild_id, names):
+        def delete():
+            # delete_objects takes at most 1000 keys at a time.
+            for i in range(0, len(names), 1000):
+                self.client.delete_objects(
+                        Bucket=self.bucket,
+                        Delete={'Objects': [{'Key': self.key(guild_id, name)} for name in names[i:i + 1000]]}
+                )
+            for name in names:
+                self._evict(guild_id, name)
+
+        await self._run(delete)
+
+    async def fetch(self, guild_id, name):
+        path = self.cached_path(guild_id, name)
+        with self._cached_lock:
+            cached = self._cached.get(path)
+
+        # a path that was never fetched is stale, however young the monotonic clock is.
+        etag = None
+        if cached is not None:
+            etag, checked = cached
+            if time.monotonic() - checked < self.cache_ttl:
+                return path
+
+        future = self._fetching.get(path)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch(guild_id, name, path, etag))
+            self._fetching[path] = future
+            future.add_done_callback(lambda _: self._fetching.pop(path, None))
+
+        # one caller giving up must not cancel the download for the others.
+        await asyncio.shield(future)
+        return path
+
+    async def _fetch(self, guild_id: int, name: str, path: Path, etag: str):
+        def fetch():
+            key = self.key(guild_id, name)
+            current = self.client.head_object(Bucket=self.bucket, Key=key)['ETag']
+            if current != etag or not path.exists():
+                log.debug(f'Downloading {key} into the local cache.')
+                path.parent.mkdir(exist_ok=True)
+                # other processes may share the cache directory.
+                partial_path = path.with_name(f'{path.name}.{os.getpid()}.part')
+                self.client.download_file(self.bucket, key, str(partial_path))
+                os.replace(partial_path, path)
+            return current
+
+        etag = await self._run(fetch)
+        with self._cached_lock:
+            self._cached[path] = (etag, time.monotonic())
+
+    def _evict(self, guild_id: int, name: str):
+        path = self.cached_path(guild_id, name)
+        with self._cached_lock:
+            self._cached.pop(path, None)
+        path.unlink(missing_ok=True)
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, List, Optional
+
+__all__ = ['LoopWatchdog', 'LagStats', 'Stall']
+
+log = logging.getLogger(__name__)
+
+# how many of the innermost frames of a blocked stack are kept.
+STACK_DEPTH = 20
+# how many stalls are kept for the lag command.
+MAX_STALLS = 20
+
+
+@dataclass
+class Stall:
+    # wall clock time the stall was noticed at.
+    when: float
+    # how long the loop had been blocked for when its stack was captured.
+    blocked: float
+    # the innermost frame, which is usually the blocking call.
+    call_site: str
+    stack: str
+
+
+@dataclass
+class LagStats:
+    # over the last window of samples.
+    samples: int
+    mean: float
+    p99: float
+    max: float
+    # since the watchdog started.
+    stalls: int
+    recent_stalls: List[Stall]
+
+
+class LoopWatchdog:
+    """
+    Measures how late the event loop wakes up a task that sleeps for a fixed interval, which is how long every other
+    callback had to wait as well.
+
+    A separate thread watches the heartbeat. When the loop has been stuck for longer than the threshold, it captures
+    the stack of the loop's thread while it is still stuck, so a blocking call is caught where it happens rather than
+    inferred afterwards.
+    """
+
+    def __init__(
+            self,
+            loop: asyncio.AbstractEventLoop,
+            threshold: float = 0.25,
+            interval: float = 0.1,
+            report_interval: float = 60
+    ):
+        """
+        :param loop: The event loop to watch.
+        :param threshold: Seconds of lag after which the loop counts as blocked.
+        :param interval: Seconds between heartbeats.
+        :param report_interval: Seconds between lag reports in the log. 0 disables them.
+        """
+        self.loop = loop
+        self.threshold = threshold
+        self.interval = interval
+        self.report_interval = report_interval
+
+        self.lags: Deque[float] = deque(maxlen=max(1, int(report_interval / interval)) if report_interval else 600)
+        self.stalls: Deque[Stall] = deque(maxlen=MAX_STALLS)
+        self.stall_count = 0
+
+        # when the heartbeat last ran, by the monotonic clock. written by the loop and read by the watchdog thread.
+        self._beat = time.perf_counter()
+        # the heartbeat whose stall was already captured, so that one stall is only reported once.
+        self._captured = None
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        """
+        Start watching. Must be called from the event loop's thread.
+        """
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._beat = time.perf_counter()
+        # a new event, so that the thread of an earlier run can't be revived by clearing it.
+        self._stopped = threading.Event()
+        self._task = self.loop.create_task(self._heartbeat())
+        self._thread = threading.Thread(
+                target=self._watch,
+                args=(self._stopped,),
+                daemon=True,
+                name='soundbert-watchdog'
+        )
+        self._thread.start()
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._stopped.set()
+        self._thread = None
+
+    def stats(self) -> LagStats:
+        lags = sorted(self.lags)
+        return LagStats(
+                samples=len(lags),
+                mean=sum(lags) / len(lags) if lags else 0.0,
+                p99=lags[min(len(lags) - 1, int(len(lags) * 0.99))] if lags else 0.0,
+                max=lags[-1] if lags else 0.0,
+                stalls=self.stall_count,
+                recent_stalls=list(self.stalls)
+        )
+
+    async def _heartbeat(self):
+        last_report = time.perf_counter()
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            self._beat = now
+            self.lags.append(max(0.0, now - expected))
+
+            if self.report_interval and now - last_report >= self.report_interval:
+                last_report = now
+                self._report()
+
+    def _report(self):
+        stats = self.stats()
+        log.info(
+                f'Event loop lag: {stats.mean * 1000:.1f} ms mean, {stats.p99 * 1000:.1f} ms p99, '
+                f'{stats.max * 1000:.1f} ms max.',
+                extra={
+                    'loop_lag_mean': stats.mean,
+                    'loop_lag_p99':  stats.p99,
+                    'loop_lag_max':  stats.max,
+                    'loop_stalls':   stats.stalls
+                }
+        )
+
+    def _watch(self, stopped: threading.Event):
+        while not stopped.wait(self.interval / 2):
+            beat = self._beat
+            blocked = time.perf_counter() - beat - self.interval
+            if blocked < self.threshold or self._captured == beat:
+                continue
+            self._captured = beat
+
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            call_site = f'{frame.f_code.co_filename}:{frame.f_lineno} in {frame.f_code.co_name}'
+            stack = ''.join(traceback.format_stack(frame, limit=STACK_DEPTH))
+            del frame
+
+            stall = Stall(time.time(), blocked, call_site, stack)
+            self.stalls.append(stall)
+            self.stall_count += 1
+            log.warning(
+                    f'Event loop blocked for over {blocked:.3f}s at:\n{stack}',
+                    extra={'loop_blocked': blocked, 'call_site': stall.call_site}
+            )
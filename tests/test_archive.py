@@ -0,0 +1,47 @@
+import io
+import tarfile
+
+import discord
+
+from soundbert.cogs.utils.archive import ArchiveMember, TarStream
+
+
+def _members(tmp_path):
+    sound = tmp_path / 'airhorn.mp3'
+    sound.write_bytes(b'\xff' * 1000)
+    return [
+        ArchiveMember.from_bytes('soundbert.json', b'{"sounds": []}'),
+        ArchiveMember('airhorn.mp3', 1000, path=sound, mtime=0)
+    ]
+
+
+def test_archive_is_a_tar(tmp_path):
+    stream = TarStream(_members(tmp_path))
+    data = stream.read()
+
+    assert len(data) == stream.size
+    with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+        assert tar.getnames() == ['soundbert.json', 'airhorn.mp3']
+        assert tar.extractfile('soundbert.json').read() == b'{"sounds": []}'
+        assert tar.extractfile('airhorn.mp3').read() == b'\xff' * 1000
+
+
+def test_archive_can_be_uploaded(tmp_path):
+    file = discord.File(TarStream(_members(tmp_path)), filename='sounds.tar')
+    first = file.fp.read()
+
+    # discord.py seeks back to the start to retry a failed upload.
+    file.reset()
+    assert file.fp.read() == first
+
+    with tarfile.open(fileobj=io.BytesIO(first)) as tar:
+        assert tar.getnames() == ['soundbert.json', 'airhorn.mp3']
+
+
+def test_files_that_changed_size_keep_their_planned_size(tmp_path):
+    members = _members(tmp_path)
+    (tmp_path / 'airhorn.mp3').write_bytes(b'\xff' * 10)
+
+    data = TarStream(members).read()
+    with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+        assert tar.extractfile('airhorn.mp3').read() == b'\xff' * 10 + bytes(990)
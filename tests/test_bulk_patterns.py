@@ -0,0 +1,47 @@
+import pytest
+
+from soundbert.cogs.soundboard import SoundBoard, exceptions
+from soundbert.database import sound_names
+
+NAMES = ['air', 'airhorn', 'chair', 'hair_dryer']
+
+
+def _records(names):
+    return [
+        {sound_names.c.id: i, sound_names.c.sound_id: i, sound_names.c.name: name, sound_names.c.is_alias: False}
+        for i, name in enumerate(names)
+    ]
+
+
+def _matching(pattern):
+    match = SoundBoard._compile(pattern)
+    return [name for name in NAMES if match(name)]
+
+
+def test_globs_match_whole_names():
+    assert _matching('air*') == ['air', 'airhorn']
+    assert _matching('AIR') == ['air']
+    assert _matching('*air*') == NAMES
+
+
+def test_regular_expressions_match_anywhere():
+    assert _matching('re:air') == NAMES
+    assert _matching('re:^air') == ['air', 'airhorn']
+
+
+def test_glob_substitution_replaces_whole_name():
+    records = _records(NAMES)
+    renames = SoundBoard._substitute(records, records[:2], 'air*', r'\g<0>_old')
+    assert [new_name for _, new_name in renames] == ['air_old', 'airhorn_old']
+
+
+def test_regular_expression_substitution_replaces_match():
+    records = _records(NAMES)
+    renames = SoundBoard._substitute(records, records[3:], 're:air', 'x')
+    assert [new_name for _, new_name in renames] == ['hx_dryer']
+
+
+def test_substitution_collisions():
+    records = _records(NAMES)
+    with pytest.raises(exceptions.SoundExists):
+        SoundBoard._substitute(records, records[:2], 'air*', 'chair')
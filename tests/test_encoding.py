@@ -0,0 +1,48 @@
+import time
+
+import discord
+import pytest
+from discord.opus import Encoder as OpusEncoder
+
+from soundbert.cogs.soundboard.encoding import EncoderPool, EncodingSource
+
+
+class Silence(discord.AudioSource):
+    def __init__(self, frames: int):
+        self.frames = frames
+
+    def read(self):
+        if not self.frames:
+            return b''
+        self.frames -= 1
+        return b'\0' * OpusEncoder.FRAME_SIZE
+
+
+@pytest.fixture
+def pool():
+    pool = EncoderPool(1)
+    yield pool
+    pool.close()
+
+
+@pytest.mark.skipif(discord.opus.is_loaded(), reason='needs libopus to be missing')
+def test_failed_open_does_not_hang(pool):
+    # without libopus the worker can't open the stream, and neither can the local fallback.
+    source = pool.encode(Silence(10))
+    assert isinstance(source, EncodingSource)
+
+    start = time.perf_counter()
+    assert source.read() == b''
+    assert time.perf_counter() - start < 5
+    assert source.stream_id not in pool.workers[0].streams
+    source.cleanup()
+
+
+def test_dead_workers_are_skipped(pool):
+    worker = pool.workers[0]
+    worker.process.terminate()
+    worker.process.join()
+    worker.router.join(timeout=5)
+
+    source = Silence(10)
+    assert pool.encode(source) is source
@@ -0,0 +1,28 @@
+import json
+import logging
+
+from soundbert.logs import JsonFormatter, TextFormatter
+
+
+def _record(**extra):
+    record = logging.makeLogRecord({'name': 'soundbert', 'levelno': logging.INFO, 'levelname': 'INFO'})
+    record.msg = 'Command 3 invoked.'
+    record.__dict__.update(extra)
+    return record
+
+
+def test_text_includes_structured_fields():
+    record = _record(command='play', guild_id=1, channel_id=None, sample=True)
+    text = TextFormatter(logging.BASIC_FORMAT).format(record)
+    assert text == 'INFO:soundbert:Command 3 invoked. [command=play guild_id=1]'
+
+
+def test_text_without_structured_fields():
+    assert TextFormatter(logging.BASIC_FORMAT).format(_record()) == 'INFO:soundbert:Command 3 invoked.'
+
+
+def test_json_includes_structured_fields():
+    entry = json.loads(JsonFormatter().format(_record(command='play', guild_id=1)))
+    assert entry['message'] == 'Command 3 invoked.'
+    assert entry['command'] == 'play'
+    assert entry['guild_id'] == 1
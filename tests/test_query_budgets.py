@@ -0,0 +1,174 @@
+"""
+Checks how many database round trips the hot paths make, by sending messages through a real bot backed by a migrated
+SQLite database. Only the voice connection is stubbed out.
+"""
+import asyncio
+import logging
+import os
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from alembic import command
+from alembic.config import Config as AlembicConfig
+
+import soundbert
+from soundbert.cogs.soundboard import SoundBoard
+from soundbert.config import Config
+from soundbert.database import guilds, sound_names, sounds
+from soundbert.soundbert import SoundBert
+
+GUILD_ID = 1
+SOUND_ID = 1
+OWNER_ID = 10
+USER_ID = 20
+BOT_ID = 30
+
+
+class StubVoice:
+    async def join(self, channel):
+        return SimpleNamespace(channel=channel)
+
+    async def start(self, owner, source, channel, replace=True, settings=None):
+        source.cleanup()
+
+
+async def _reply(*args, **kwargs):
+    pass
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    loop.close()
+    asyncio.set_event_loop(None)
+
+
+@pytest.fixture
+def database_url(tmp_path):
+    url = f'sqlite:///{tmp_path / "soundbert.db"}'
+    alembic_config = AlembicConfig(str(Path(soundbert.__file__).parent / 'alembic.ini'))
+    previous = os.environ.get('SOUNDBERT_DATABASE_URL')
+    os.environ['SOUNDBERT_DATABASE_URL'] = url
+    try:
+        command.upgrade(alembic_config, 'head')
+    finally:
+        if previous is None:
+            del os.environ['SOUNDBERT_DATABASE_URL']
+        else:
+            os.environ['SOUNDBERT_DATABASE_URL'] = previous
+    return url
+
+
+@pytest.fixture
+def bot(loop, database_url, tmp_path):
+    config = Config(
+            token='',
+            database_url=database_url,
+            default_prefix='!',
+            sound_path=str(tmp_path),
+            loop_lag_threshold=0
+    )
+    bot = SoundBert(config)
+    bot.owner_id = OWNER_ID
+    bot._connection.user = SimpleNamespace(id=BOT_ID, mention=f'<@{BOT_ID}>')
+
+    cog = SoundBoard(bot)
+    cog.voice = lambda guild: StubVoice()
+    # played from the audio cache, so that no decoder is needed.
+    cog.audio_cache.put(SOUND_ID, b'\0' * 3840)
+    bot.add_cog(cog)
+
+    async def seed():
+        await bot.db.connect()
+        await bot.db.execute(guilds.insert().values(id=GUILD_ID, prefix='!'))
+        await bot.db.execute(
+                sounds.insert().values(id=SOUND_ID, source='https://example.com', uploader=USER_ID, length=1.0)
+        )
+        await bot.db.execute(
+                sound_names.insert().values(sound_id=SOUND_ID, guild_id=GUILD_ID, name='airhorn', is_alias=False)
+        )
+
+    loop.run_until_complete(seed())
+    yield bot
+    loop.run_until_complete(bot.db.disconnect())
+
+
+def _send(bot: SoundBert, content: str):
+    """
+    Have the bot process a message from a member who is in a voice channel.
+
+    :return: The message's context.
+    """
+    guild = SimpleNamespace(id=GUILD_ID, name='guild', owner_id=OWNER_ID + 1, get_role=lambda role_id: None)
+    author = SimpleNamespace(
+            id=USER_ID,
+            bot=False,
+            roles=[],
+            guild_permissions=SimpleNamespace(manage_guild=False),
+            voice=SimpleNamespace(channel=SimpleNamespace(id=2, name='voice', bitrate=64000))
+    )
+    message = SimpleNamespace(
+            id=3,
+            content=content,
+            author=author,
+            guild=guild,
+            channel=SimpleNamespace(id=4, send=_reply),
+            add_reaction=_reply,
+            _state=bot._connection
+    )
+
+    contexts = []
+    get_context = bot.get_context
+
+    async def recording_get_context(message, **kwargs):
+        ctx = await get_context(message, **kwargs)
+        contexts.append(ctx)
+        return ctx
+
+    bot.get_context = recording_get_context
+    try:
+        bot.loop.run_until_complete(bot.process_commands(message))
+    finally:
+        del bot.get_context
+    return contexts[0]
+
+
+def _budget(bot: SoundBert, name: str) -> int:
+    return bot.get_command(name).callback.__query_budget__
+
+
+def test_plain_message_with_cached_settings(bot):
+    bot.loop.run_until_complete(bot.guild_settings(GUILD_ID))
+
+    ctx = _send(bot, 'hello')
+
+    assert ctx.command is None
+    assert ctx.queries.round_trips == 0
+
+
+def test_play_with_cached_settings(bot, caplog):
+    bot.loop.run_until_complete(bot.guild_settings(GUILD_ID))
+
+    with caplog.at_level(logging.WARNING, logger='soundbert.querycount'):
+        ctx = _send(bot, '!play airhorn')
+
+    assert ctx.command is bot.get_command('play')
+    assert not ctx.command_failed
+    # looking up the sound, and counting the play.
+    assert ctx.queries.round_trips == 2
+    assert ctx.queries.round_trips <= _budget(bot, 'play')
+    assert not caplog.records
+
+
+def test_play_with_uncached_settings(bot):
+    ctx = _send(bot, '!play airhorn')
+
+    assert not ctx.command_failed
+    # fetching the guild's settings for the prefix, which the checks then reuse.
+    assert ctx.queries.round_trips == 3
+
+    played = bot.loop.run_until_complete(bot.db.fetch_val(sounds.select().with_only_columns([sounds.c.played])))
+    assert played == 1
@@ -0,0 +1,89 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from soundbert.config import Config
+from soundbert.database import guilds
+from soundbert.routing import RoutingDatabase, for_guild
+from soundbert.soundbert import SoundBert
+
+GUILD_ID = 1
+
+
+@pytest.fixture
+def bot(tmp_path):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    config = Config(
+            token='',
+            database_url=f'sqlite:///{tmp_path / "primary.db"}',
+            replica_database_url=f'sqlite:///{tmp_path / "replica.db"}',
+            default_prefix='!',
+            sound_path=str(tmp_path),
+            loop_lag_threshold=0
+    )
+    yield SoundBert(config)
+    loop.close()
+    asyncio.set_event_loop(None)
+
+
+def _readable(db: RoutingDatabase, guild_id: int) -> bool:
+    with for_guild(guild_id):
+        return db._readable(guilds.select())
+
+
+def _receive(bot: SoundBert, kind: str, **fields):
+    payload = json.dumps({'origin': 'another process', 'kind': kind, 'fields': fields})
+    bot.notifier._receive(None, None, None, payload)
+
+
+def test_own_writes_stick_to_the_primary(bot):
+    assert _readable(bot.db, GUILD_ID)
+    with for_guild(GUILD_ID):
+        bot.db._wrote(guilds.update())
+    assert not _readable(bot.db, GUILD_ID)
+    assert _readable(bot.db, GUILD_ID + 1)
+
+
+@pytest.mark.parametrize('kind,fields', [('guild', {}), ('sounds', {'sound_ids': [1]})])
+def test_other_processes_writes_stick_to_the_primary(bot, kind, fields):
+    _receive(bot, kind, guild_id=GUILD_ID, **fields)
+
+    assert not _readable(bot.db, GUILD_ID)
+    assert _readable(bot.db, GUILD_ID + 1)
+
+
+def test_flush_sticks_every_guild_to_the_primary(bot):
+    bot.notifier._flush()
+
+    assert not _readable(bot.db, GUILD_ID)
+    assert not _readable(bot.db, None)
+
+
+def test_stickiness_wears_off(bot):
+    bot.db.stickiness = 0
+    _receive(bot, 'guild', guild_id=GUILD_ID)
+    bot.notifier._flush()
+
+    assert _readable(bot.db, GUILD_ID)
+
+
+def test_expired_writes_are_forgotten(bot, monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(time, 'monotonic', lambda: now)
+    bot.db.stickiness = 5
+    bot.db._swept = now
+    for guild_id in range(10):
+        _receive(bot, 'guild', guild_id=guild_id)
+    assert len(bot.db._written) == 10
+
+    # reading after the window drops the guild's entry.
+    now += 5
+    assert _readable(bot.db, 0)
+    assert 0 not in bot.db._written
+
+    # the next write sweeps out the rest.
+    _receive(bot, 'guild', guild_id=GUILD_ID + 100)
+    assert list(bot.db._written) == [GUILD_ID + 100]
@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+
+from soundbert.config import Config
+from soundbert.soundbert import SoundBert
+
+
+def test_failed_extension_load_cancels_startup(tmp_path):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    config = Config(
+            token='',
+            database_url=f'sqlite:///{tmp_path / "soundbert.db"}',
+            default_prefix='!',
+            sound_path=str(tmp_path),
+            loop_lag_threshold=0
+    )
+    bot = SoundBert(config)
+    tasks = []
+
+    async def never(*args, **kwargs):
+        tasks.append(asyncio.current_task())
+        await asyncio.sleep(60)
+
+    async def broken():
+        raise RuntimeError('broken extension')
+
+    bot._connect_db = never
+    bot.login = never
+    bot._load_extensions = broken
+
+    with pytest.raises(RuntimeError, match='broken extension'):
+        loop.run_until_complete(bot.start())
+
+    assert len(tasks) == 2
+    assert all(task.cancelled() for task in tasks)
+    loop.close()
+    asyncio.set_event_loop(None)
@@ -0,0 +1,61 @@
+import asyncio
+import threading
+import time
+
+from soundbert.storage import S3Storage
+
+
+class SlowClient:
+    """
+    Stands in for a boto3 S3 client, and counts downloads.
+    """
+
+    def __init__(self):
+        self.downloads = 0
+
+    def head_object(self, Bucket, Key):
+        return {'ETag': 'etag'}
+
+    def download_file(self, bucket, key, filename):
+        self.downloads += 1
+        time.sleep(0.05)
+        with open(filename, 'wb') as f:
+            f.write(b'sound')
+
+
+def _storage(tmp_path) -> S3Storage:
+    # skip __init__, which needs boto3.
+    storage = object.__new__(S3Storage)
+    storage.bucket = 'bucket'
+    storage.cache_path = tmp_path
+    storage.cache_ttl = 300
+    storage.client = SlowClient()
+    storage._cached = {}
+    storage._cached_lock = threading.Lock()
+    storage._fetching = {}
+    return storage
+
+
+def test_concurrent_fetches_share_a_download(tmp_path):
+    storage = _storage(tmp_path)
+
+    async def fetch_all():
+        return await asyncio.gather(*(storage.fetch(1, 'airhorn') for _ in range(5)))
+
+    paths = asyncio.new_event_loop().run_until_complete(fetch_all())
+
+    assert storage.client.downloads == 1
+    assert set(paths) == {tmp_path / '1' / 'airhorn'}
+    assert (tmp_path / '1' / 'airhorn').read_bytes() == b'sound'
+    assert not storage._fetching
+
+
+def test_first_fetch_downloads_on_a_young_clock(tmp_path, monkeypatch):
+    # right after boot, the monotonic clock can be well below cache_ttl.
+    monkeypatch.setattr(time, 'monotonic', lambda: 1.0)
+    storage = _storage(tmp_path)
+
+    path = asyncio.new_event_loop().run_until_complete(storage.fetch(1, 'airhorn'))
+
+    assert storage.client.downloads == 1
+    assert path.read_bytes() == b'sound'
@@ -0,0 +1,96 @@
+import asyncio
+from types import SimpleNamespace
+
+import discord
+
+from soundbert.cogs.soundboard.voice import GuildVoice, _SwappableSource
+
+
+class Frames(discord.AudioSource):
+    def __init__(self, frames, on_end=None):
+        self.frames = list(frames)
+        self.on_end = on_end
+        self.cleaned_up = False
+
+    def read(self):
+        if self.frames:
+            return self.frames.pop(0)
+        if self.on_end is not None:
+            self.on_end()
+        return b''
+
+    def is_opus(self):
+        return True
+
+    def cleanup(self):
+        self.cleaned_up = True
+
+
+class StubVoiceClient:
+    """
+    Plays like discord.py's VoiceClient, except that its player only runs when told to.
+    """
+
+    def __init__(self):
+        self.channel = SimpleNamespace(id=1)
+        self.encoder = None
+        self.source = None
+        self.after = None
+        self.stopped = False
+
+    def is_playing(self):
+        return self.source is not None and not self.stopped
+
+    def play(self, source, *, after=None):
+        self.source, self.after, self.stopped = source, after, False
+
+    def stop(self):
+        self.stopped = True
+
+    def drain(self):
+        data = []
+        while True:
+            frame = self.source.read()
+            if not frame:
+                return data
+            data.append(frame)
+
+
+def test_swap_during_the_last_read_keeps_playing():
+    new = Frames([b'new'])
+    wrapper = _SwappableSource(None)
+    # the old source runs out just as it is swapped out.
+    old = Frames([b'old'], on_end=lambda: wrapper.swap(new))
+    wrapper.source = old
+
+    assert wrapper.read() == b'old'
+    assert wrapper.read() == b'new'
+    assert not wrapper.ended
+    assert wrapper.read() == b''
+    assert wrapper.ended
+
+
+def test_no_swap_once_ended():
+    wrapper = _SwappableSource(Frames([]))
+    assert wrapper.read() == b''
+    assert wrapper.swap(Frames([b'new'])) is None
+
+
+def test_start_after_the_end_was_read_starts_over():
+    loop = asyncio.new_event_loop()
+    vclient = StubVoiceClient()
+    voice = GuildVoice(SimpleNamespace(id=1, voice_client=vclient), loop)
+
+    first, second = Frames([b'first']), Frames([b'second'])
+    loop.run_until_complete(voice.start(None, first, vclient.channel))
+    player = vclient.source
+    assert vclient.drain() == [b'first']
+
+    # the player read the end but has not stopped yet, when the next sound comes in.
+    loop.run_until_complete(voice.start(None, second, vclient.channel))
+
+    assert vclient.source is not player
+    assert vclient.drain() == [b'second']
+    voice.close()
+    loop.run_until_complete(asyncio.gather(voice._task, return_exceptions=True))
+    loop.close()